@@ -1,7 +1,31 @@
 #!/usr/bin/env python
 # 0.0.0
+import os, sys
+
+def get_socket():
+    return os.path.join(os.path.dirname(os.path.realpath(__file__)), "Cache", "daemon.sock")
+
+if __name__ == '__main__' and "--client" in sys.argv[1:]:
+    # Hand the job to a running daemon before paying for the imports and
+    # setup below - falling through to run locally if there isn't one
+    from Scripts import client
+    argv = [x for x in sys.argv[1:] if x != "--client"]
+    path = next((argv[i+1] for i,x in enumerate(argv[:-1]) if x == "--socket"),get_socket())
+    try:
+        sys.exit(client.Client(path).run(argv))
+    except (OSError, IOError):
+        pass
+
 from Scripts import *
-import os, tempfile, shutil, plistlib, sys, binascii, zipfile
+import tempfile, shutil, plistlib, binascii, struct, zipfile, hashlib, json, base64, argparse, collections, signal, time, threading, mmap
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    from StringIO import StringIO
+except:
+    from io import StringIO
 
 class FixHPET:
     def __init__(self, **kwargs):
@@ -9,6 +33,8 @@ class FixHPET:
         self.u  = utils.Utils("FixHPET")
         self.r  = run.Run()
         self.re = reveal.Reveal()
+        self.w  = workspace.Workspace()
+        self.atomic = atomic.Atomic()
         self.iasl_url = "https://bitbucket.org/RehabMan/acpica/downloads/iasl.zip"
         self.iasl = None
         self.dsdt = None
@@ -18,7 +44,25 @@ class FixHPET:
         self.xcrs = "58435253"
         self.legacy_irq = ["TMR","TIMR","IPIC","RTC"] # Could add HPET for extra patch-ness, but shouldn't be needed
         self.scope = ""
+        self.quiet = True # No progress output unless main() or the CLI ask for it
         self.target_irqs = [0,8,11]
+        self.irq_masks = [1 << x for x in range(16)] # IRQ number -> IRQNoFlags mask bit
+        self.irq_endings = ["7900","8609","4701"] # End of method, middle of method, unknown
+        self.pad_limit = 32 # Pad bytes to grow with count() before building a suffix array
+        self.verify_ssdt = False # Also compile SSDT-HPET.dsl with iasl and compare against our AML
+        self.iasl_version = None
+        self.iasl_thread = None
+        self.cache = "Cache"
+        self.cache_size = 268435456 # 256MiB of compressed listings
+        self.decompile_cache = cache.Cache(os.path.join(os.path.dirname(os.path.realpath(__file__)), self.cache, "decompile"), self.cache_size)
+        self.result_cache = cache.Cache(os.path.join(os.path.dirname(os.path.realpath(__file__)), self.cache, "results"), self.cache_size)
+        self.summary_cache = cache.Cache(os.path.join(os.path.dirname(os.path.realpath(__file__)), self.cache, "summaries"), self.cache_size)
+        self.tables = collections.OrderedDict() # Parsed DSDTs kept in RAM when running as a daemon
+        self.tables_size = 0
+        self.patch_memo = {} # Per-device patches for the current DSDT
+        self.patch_lock = threading.Lock()
+        self.local = threading.local() # Lets background threads keep quiet
+        self.result_files = ["SSDT-HPET.dsl","SSDT-HPET.aml","patches_OC.plist","patches_Clover.plist"]
         self.ssdt_source = """//
 // Supplementary HPET _CRS from Goldfish64
 // Requires the HPET's _CRS to XCRS rename
@@ -30,7 +74,7 @@ DefinitionBlock ("", "SSDT", 2, "hack", "HPET", 0x00000000)
     Name (\_SB.PCI0.[[scope]].HPET._CRS, ResourceTemplate ()  // _CRS: Current Resource Settings
     {
         IRQNoFlags ()
-            {0,8,11}
+            {[[irqs]]}
         Memory32Fixed (ReadWrite,
             0xFED00000,         // Address Base
             0x00000400,         // Address Length
@@ -45,18 +89,23 @@ DefinitionBlock ("", "SSDT", 2, "hack", "HPET", 0x00000000)
             os.mkdir(t_folder)
         return t_folder
     
-    def check_iasl(self):
-        self.u.head("Checking For iasl")
-        print("")
-        target = os.path.join(os.path.dirname(os.path.realpath(__file__)), self.scripts, "iasl")
-        if not os.path.exists(target):
-            # Need to download
-            temp = tempfile.mkdtemp()
-            try:
-                self._download_and_extract(temp,self.iasl_url)
-            except Exception as e:
-                print("An error occurred :(\n - {}".format(e))
-            shutil.rmtree(temp, ignore_errors=True)
+    def check_iasl(self, download = True):
+        self.log("Checking for iasl...")
+        script_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), self.scripts)
+        target = os.path.join(script_dir, "iasl")
+        if download and not os.path.exists(target):
+            # Need to download - only one process at a time, and anyone who
+            # waited on the lock finds it already there
+            with open(os.path.join(script_dir, ".iasl.lock"),"a") as lock:
+                if fcntl:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+                if not os.path.exists(target):
+                    temp = tempfile.mkdtemp()
+                    try:
+                        self._download_and_extract(temp,self.iasl_url)
+                    except Exception as e:
+                        self.log("An error occurred :(\n - {}".format(e))
+                    shutil.rmtree(temp, ignore_errors=True)
         if os.path.exists(target):
             return target
         return None
@@ -64,9 +113,9 @@ DefinitionBlock ("", "SSDT", 2, "hack", "HPET", 0x00000000)
     def _download_and_extract(self, temp, url):
         ztemp = tempfile.mkdtemp(dir=temp)
         zfile = os.path.basename(url)
-        print("Downloading {}".format(os.path.basename(url)))
+        self.log("Downloading {}".format(os.path.basename(url)))
         self.dl.stream_to_file(url, os.path.join(ztemp,zfile), False)
-        print(" - Extracting")
+        self.log(" - Extracting")
         btemp = tempfile.mkdtemp(dir=temp)
         # Extract with built-in tools \o/
         with zipfile.ZipFile(os.path.join(ztemp,zfile)) as z:
@@ -75,56 +124,28 @@ DefinitionBlock ("", "SSDT", 2, "hack", "HPET", 0x00000000)
         for x in os.listdir(os.path.join(temp,btemp)):
             if "iasl" in x.lower():
                 # Found one
-                print(" - Found {}".format(x))
-                print("   - Chmod +x")
-                self.r.run({"args":["chmod","+x",os.path.join(btemp,x)]})
-                print("   - Copying to {} directory".format(os.path.basename(script_dir)))
-                shutil.copy(os.path.join(btemp,x), os.path.join(script_dir,x))
-
-    def list_irqs(self, dsdt):
-        # Walks the DSDT keeping track of the current device and
-        # saving the IRQNoFlags if found
-        devices = {}
-        current_device = None
-        irq = False
-        last_irq = False
-        irq_index = 0
-        for index,line in enumerate(dsdt):
-            if ":" in line.split("//")[0]:
-                # Skip all hex lines
-                continue
-            if irq:
-                # Get the values
-                num = line.split("{")[1].split("}")[0].replace(" ","")
-                num = "#" if not len(num) else num
-                if current_device in devices:
-                    if last_irq: # In a row
-                        devices[current_device] += ":"+num
-                    else: # Skipped at least one line
-                        irq_index = self.find_next_hex(dsdt, index)[1]
-                        devices[current_device] += "-"+str(irq_index)+"|"+num
-                else:
-                    irq_index = self.find_next_hex(dsdt, index)[1]
-                    devices[current_device] = str(irq_index)+"|"+num
-                irq = False
-                last_irq = True
-            elif "Device (" in line:
-                current_device = line.split("(")[1].split(")")[0]
-                last_irq = False
-            elif "IRQNoFlags" in line and current_device:
-                # Next line has our interrupts
-                irq = True
-            # Check if just a filler line
-            elif len(line.replace("{","").replace("}","").replace("(","").replace(")","").replace(" ","").split("//")[0]):
-                # Reset last IRQ as it's not in a row
-                last_irq = False
-        return devices
+                self.log(" - Found {}".format(x))
+                self.log("   - Copying to {} directory".format(os.path.basename(script_dir)))
+                # Renamed into place already executable, so nobody can run
+                # a half copied binary
+                with open(os.path.join(btemp,x),"rb") as f:
+                    self.atomic.write(os.path.join(script_dir,x), iter(lambda: f.read(1048576), b""), mode=0o755)
 
     def get_hex_from_int(self, total):
-        hex_str = hex(total)[2:].upper().rjust(4,"0")
-        return "".join([hex_str[i:i + 2] for i in range(0, len(hex_str), 2)][::-1])
+        # Little-endian hex of a 16-bit IRQ mask
+        return binascii.hexlify(struct.pack("<H",total)).decode("utf-8").upper()
 
-    def get_hex_from_irqs(self, irq, rem_irq = None):
+    def get_rem_mask(self, rem_irq = None):
+        # Returns the mask of IRQs to strip - all of them if none are listed
+        if not rem_irq:
+            return 0xFFFF
+        mask = 0
+        for x in rem_irq:
+            if 0 <= x < len(self.irq_masks):
+                mask |= self.irq_masks[x]
+        return mask
+
+    def get_hex_from_irqs_batch(self, items):
         # We need to search for a few different types:
         #
         # 22 XX XX 22 XX XX 22 XX XX (multiples on different lines)
@@ -132,126 +153,72 @@ DefinitionBlock ("", "SSDT", 2, "hack", "HPET", 0x00000000)
         # 22 XX XX (single IRQNoFlags entry)
         # 
         # Can end with 79 [00] (end of method), 86 09 (middle of method) or 47 01 (unknown)
-        lines = []
-        for a in irq.split("-"):
-            index,i = a.split("|") # Get the index
-            index = int(index)
-            find = self.get_int_for_line(i)
-            repl = [0]*len(find)
-            # Now we need to verify if we're patching *all* IRQs, or just some specifics
-            if rem_irq:
-                repl = [x for x in find]
-                matched = []
-                for x in rem_irq:
-                    # Get the int
-                    rem = self.convert_irq_to_int(x)
-                    repl = [x&(rem^0xFFFF) if x >= rem else x for x in repl]
-            # Get the hex
+        #
+        # Takes a dict of key -> (IRQ records, IRQs to remove) and works out the
+        # find and replace masks for all of them at once - packing them to hex
+        # in a single pass.  Returns a dict of key -> list of patch dicts.
+        groups = []
+        finds = []
+        repls = []
+        for key in items:
+            irqs,rem_irq = items[key]
+            keep = self.get_rem_mask(rem_irq) ^ 0xFFFF
+            for group in self.get_irq_groups(irqs):
+                groups.append((key,group))
+                for r in group:
+                    finds.append(r.mask)
+                    repls.append(r.mask & keep)
+        # 4 hex chars per descriptor, little-endian
+        find_hex = binascii.hexlify(struct.pack("<{}H".format(len(finds)),*finds)).decode("utf-8").upper()
+        repl_hex = binascii.hexlify(struct.pack("<{}H".format(len(repls)),*repls)).decode("utf-8").upper()
+        lines = dict([(key,[]) for key in items])
+        i = 0
+        for key,group in groups:
             d = {
-                "irq":i,
-                "find": "".join(["22"+self.get_hex_from_int(x) for x in find]),
-                "repl": "".join(["22"+self.get_hex_from_int(x) for x in repl]),
-                "index": index
+                "irq":":".join([r.get_text() for r in group]),
+                "find":"".join(["22"+find_hex[x*4:x*4+4] for x in range(i,i+len(group))]),
+                "repl":"".join(["22"+repl_hex[x*4:x*4+4] for x in range(i,i+len(group))]),
+                "index":group[0].index,
+                # Raw offset just past the last descriptor, if we know it
+                "end":group[-1].offset+3 if group[-1].offset != -1 else -1
                 }
             d["changed"] = not (d["find"]==d["repl"])
-            lines.append(d)
+            lines[key].append(d)
+            i += len(group)
         return lines
-        
-    def get_int_for_line(self, irq):
-        irq_list = []
-        for i in irq.split(":"):
-            irq_list.append(self.same_line_irq(i))
-        return irq_list
 
-    def same_line_irq(self, irq):
-        # We sum the IRQ values and return the int
-        total = 0
-        for i in irq.split(","):
-            if i == "#":
-                continue # Null value
-            try: i=int(i)
-            except: continue # Not an int
-            if i > 15 or i < 0:
-                continue # Out of range
-            total = total | self.convert_irq_to_int(i)
-        return total
-
-    def convert_irq_to_int(self, irq):
-        b = "0"*(16-irq)+"1"+"0"*(irq)
-        return int(b,2)
+    def find_irq_patches(self, dev_patches, dsdt_raw):
+        # Scans the table once for every changed patch with each of our
+        # endings - returns a dict of find bytes -> list of offsets
+        m = matcher.Matcher()
+        for dev in dev_patches:
+            for t in dev_patches[dev]:
+                if not t["changed"]:
+                    continue
+                for x in self.irq_endings:
+                    m.add(self.get_hex_bytes(t["find"]+x))
+        return m.build().scan(dsdt_raw)
+
+    def get_irq_groups(self, irqs):
+        # Splits a device's IRQs into runs of chained descriptors - each run
+        # is patched as a single Find
+        groups = []
+        for r in irqs:
+            if r.chained and groups:
+                groups[-1].append(r)
+            else:
+                groups.append([r])
+        return groups
 
     def get_all_irqs(self, irq):
         irq_list = []
-        for a in irq.split("-"):
-            i = a.split("|")[1]
-            for x in i.split(":"):
-                for y in x.split(","):
-                    if y == "#":
-                        continue
-                    irq_list.append(int(y))
+        for r in irq:
+            irq_list.extend(r.get_irqs())
         return irq_list
 
-    def get_hex(self, line):
-        # strip the header and commented end
-        return line.split(":")[1].split("//")[0].replace(" ","")
-
     def get_hex_bytes(self, line):
         return binascii.unhexlify(line)
     
-    def find_next_hex(self, dsdt, index=0):
-        # Returns the index of the next set of hex digits after the passed index
-        start_index = -1
-        end_index   = -1
-        old_hex = True
-        for i,line in enumerate(dsdt[index:]):
-            if old_hex:
-                if not self.is_hex(line):
-                    # Broke out of the old hex
-                    old_hex = False
-                continue
-            # Not old_hex territory - check if we got new hex
-            if self.is_hex(line): # Checks for a :, but not in comments
-                start_index = i+index
-                hex_text,end_index = self.get_hex_starting_at(dsdt, start_index)
-                return (hex_text, start_index, end_index)
-        return ("",start_index,end_index)
-
-    def is_hex(self, line):
-        return ":" in line.split("//")[0]
-
-    def get_hex_starting_at(self, dsdt, start_index):
-        # Returns a tuple of the hex, and the ending index
-        hex_text = ""
-        index = -1
-        for i,x in enumerate(dsdt[start_index:]):
-            if not self.is_hex(x):
-                break
-            hex_text += self.get_hex(x)
-            index = i+start_index
-        return (hex_text, index)
-
-    def find_hpet_crs(self, dsdt):
-        found_hpet = False
-        found_crs  = False
-        for i,line in enumerate(dsdt):
-            if ":" in line.split("//")[0]:
-                # Skip all hex lines
-                continue
-            if "Device (HPET)" in line:
-                found_hpet = True
-                pad = line.split("Device (HPET)")[0]
-                continue
-            if not found_hpet:
-                continue
-            # We have the HPET device and such
-            if not len(line.strip()):
-                # Empty line
-                continue
-            if "Method (_CRS" in line:
-                # Found the _CRS - let's go until we hit the hex
-                return self.find_next_hex(dsdt,i)[1]
-        return -1
-
     def get_data(self, data):
         if sys.version_info >= (3, 0):
             return data
@@ -283,9 +250,46 @@ DefinitionBlock ("", "SSDT", 2, "hack", "HPET", 0x00000000)
             "TableSignature": zero
         }
 
-    def get_unique_pad(self, current_hex, dsdt_contents, dsdt_raw, index):
+    def get_unique_pad(self, current_hex, dsdt_index, dsdt_raw, index, memo = None):
+        # Returns any pad needed to make the passed patch unique - slicing the
+        # pad straight out of the raw table when the listing offsets line up.
+        # Short pads are grown a byte at a time, and only one that runs past
+        # pad_limit bytes builds a suffix array - kept in memo["sa"] if passed.
+        check_bytes = self.get_hex_bytes(current_hex)
+        if dsdt_raw.count(check_bytes) == 1:
+            # Already unique - no pad needed
+            return ""
+        start,end = dsdt_index.get_offset(index, dsdt_raw)
+        pos = dsdt_raw.find(check_bytes, start, end) if start != -1 else -1
+        if pos == -1:
+            if dsdt_index.raw_spans:
+                # Built by the walker - there's no listing hex to walk
+                raise Exception("Could not locate {} in the AML".format(current_hex))
+            # Couldn't map it - walk the listing's hex instead
+            return self.get_unique_pad_from_listing(current_hex, dsdt_index, dsdt_raw, index)
+        pad_start = pad_end = pos+len(check_bytes)
+        while dsdt_raw.count(dsdt_raw[pos:pad_end]) > 1:
+            # More than one instance - add more pad
+            if pad_end >= len(dsdt_raw):
+                raise Exception("Hit end of file before unique hex was found!")
+            if pad_end-pad_start >= self.pad_limit:
+                # A repetitive stretch - let the suffix array size the rest
+                sa = memo.get("sa") if memo != None else None
+                if sa == None:
+                    sa = suffix.SuffixArray(dsdt_raw)
+                    if memo != None:
+                        memo["sa"] = sa
+                length = sa.unique_length(pos, pad_end-pos)
+                if length == -1:
+                    raise Exception("Hit end of file before unique hex was found!")
+                pad_end = pos+length
+                break
+            pad_end += 1
+        return binascii.hexlify(dsdt_raw[pad_start:pad_end]).decode().upper()
+
+    def get_unique_pad_from_listing(self, current_hex, dsdt_index, dsdt_raw, index):
         # Returns any pad needed to make the passed patch unique
-        line,last_index  = self.get_hex_starting_at(dsdt_contents,index)
+        line,last_index  = dsdt_index.get_hex_starting_at(index)
         pad = ""
         line  = current_hex.join(line.split(current_hex)[1:])
         while True:
@@ -295,7 +299,7 @@ DefinitionBlock ("", "SSDT", 2, "hack", "HPET", 0x00000000)
                 # More than one instance - add more pad
                 if not len(line):
                     # Need to grab more 
-                    line, start_index, last_index = self.find_next_hex(dsdt_contents,last_index)
+                    line, start_index, last_index = dsdt_index.find_next_hex(last_index)
                     if last_index == -1:
                         raise Exception("Hit end of file before unique hex was found!")
                 pad += line[0:2]
@@ -304,6 +308,52 @@ DefinitionBlock ("", "SSDT", 2, "hack", "HPET", 0x00000000)
             break
         return pad
 
+    def get_policy(self, menu, irqs):
+        # Resolves a menu option (C, O, L, or a custom "DEV1:IRQ1,IRQ2 DEV2:"
+        # list) into a dict of device -> IRQs to remove.  Raises on bad input.
+        if not len(menu):
+            menu = "c"
+        d = {}
+        if menu.lower() == "o":
+            for x in irqs:
+                d[x] = self.target_irqs
+        elif menu.lower() == "l":
+            for x in ["IPIC","TMR","TIMR","RTC"]:
+                d[x] = []
+        elif menu.lower() == "c":
+            for x in ["IPIC","TMR","TIMR","RTC"]:
+                d[x] = self.target_irqs
+        else:
+            # User supplied
+            for i in menu.split(" "):
+                if not len(i):
+                    continue
+                if i.count(":") != 1 or i.startswith(":"):
+                    raise Exception("{} should be DEV:IRQ1,IRQ2 or DEV:".format(i))
+                name,val = i.split(":")
+                try:
+                    val = [int(x) for x in val.split(",") if len(x)]
+                except ValueError:
+                    raise Exception("{} has an IRQ that isn't a number".format(i))
+                d[name.upper()] = val
+        return d
+
+    def check_request(self, policy, scope):
+        # Raises if the passed policy or scope can't work - lets the service
+        # turn bad input away before it reaches a worker
+        if isinstance(policy, dict):
+            for x in policy:
+                if not isinstance(policy[x], list) or not all(isinstance(y, int) for y in policy[x]):
+                    raise Exception("the IRQs for {} should be a list of numbers".format(x))
+        elif not hasattr(policy, "lower"):
+            raise Exception("the policy should be C, O, L, a DEV:IRQ1,IRQ2 list, or a dict")
+        else:
+            self.get_policy(policy, {})
+        if scope != None:
+            if not hasattr(scope, "lower"):
+                raise Exception("the scope should be a device name")
+            self.check_scope(scope)
+
     def get_irq_choice(self, irqs):
         while True:
             pad = 19
@@ -330,211 +380,778 @@ DefinitionBlock ("", "SSDT", 2, "hack", "HPET", 0x00000000)
                 pad = 24
             self.u.resize(80, pad)
             menu = self.u.grab("Please select an option (default is C):  ")
-            if not len(menu):
-                menu = "c"
-            d = {}
-            if menu.lower() == "o":
-                for x in irqs:
-                    d[x] = self.target_irqs
-            elif menu.lower() == "l":
-                for x in ["IPIC","TMR","TIMR","RTC"]:
-                    d[x] = []
-            elif menu.lower() == "c":
-                for x in ["IPIC","TMR","TIMR","RTC"]:
-                    d[x] = self.target_irqs
-            else:
-                # User supplied
-                for i in menu.split(" "):
-                    if not len(i):
-                        continue
-                    try:
-                        name,val = i.split(":")
-                        val = [int(x) for x in val.split(",") if len(x)]
-                    except Exception as e:
-                        # Incorrectly formatted
-                        print("!! Incorrect Custom IRQ List Format !!\n - {}".format(e))
-                        d = None
-                        break
-                    d[name.upper()] = val
-                if d == None:
-                    continue
+            try:
+                d = self.get_policy(menu, irqs)
+            except Exception as e:
+                # Incorrectly formatted
+                print("!! Incorrect Custom IRQ List Format !!\n - {}".format(e))
+                continue
             self.u.resize(80,24)
             return d
 
+    def is_quiet(self):
+        # True when running headless or on one of our background threads
+        return self.quiet or getattr(self.local,"quiet",False)
+
+    def log(self, text = ""):
+        # Prints pipeline progress unless we're keeping quiet
+        if not self.is_quiet():
+            print(text)
+
+    def provision_iasl(self):
+        # Starts locating (or downloading) and verifying iasl on a background
+        # thread so it can overlap with the prompts - get_iasl() waits on it
+        if self.iasl or self.iasl_thread:
+            return
+        self.iasl_thread = threading.Thread(target=self._provision_iasl)
+        self.iasl_thread.daemon = True
+        self.iasl_thread.start()
+
+    def _provision_iasl(self):
+        self.local.quiet = True
+        try:
+            self.iasl = self.check_iasl()
+            if self.iasl:
+                self.get_iasl_version()
+        except:
+            # get_iasl() will try again in the foreground and report it
+            pass
+
+    def get_iasl(self):
+        # Returns the path to iasl, only checking/downloading it the first time
+        t = self.iasl_thread
+        if t and t is not threading.current_thread():
+            if t.is_alive():
+                self.log("Waiting for iasl...")
+            t.join()
+            self.iasl_thread = None
+        if not self.iasl:
+            self.iasl = self.check_iasl()
+            if not self.iasl:
+                raise Exception("Could not locate or download iasl!")
+        return self.iasl
+
+    def get_cache_stats(self):
+        # Returns the hit/miss counters and sizes of each of our caches
+        return {"decompile":self.decompile_cache.stats(),"summaries":self.summary_cache.stats(),"results":self.result_cache.stats()}
+
+    def flush_cache_stats(self):
+        # Pool workers never run atexit handlers - they flush after each job
+        for c in (self.decompile_cache,self.summary_cache,self.result_cache):
+            c.flush_stats()
+
+    def get_ssdt_source(self, scope):
+        return self.ssdt_source.replace("[[scope]]",scope).replace("[[irqs]]",",".join([str(x) for x in self.target_irqs]))
+
+    def compile_ssdt(self, dsl_path):
+        # Compiles the passed SSDT-HPET.dsl with iasl and returns the resulting AML
+        aml_path = os.path.splitext(dsl_path)[0]+".aml"
+        out = self.r.run({"args":[self.get_iasl(),dsl_path]})
+        if out[2] != 0 or not os.path.exists(aml_path):
+            raise Exception("Failed to compile {}!".format(os.path.basename(dsl_path)))
+        with open(aml_path,"rb") as f:
+            return f.read()
+
+    def get_ssdt(self, scope, temp):
+        # Emits SSDT-HPET.aml directly - only using iasl if we can't encode
+        # the scope ourselves, or if verify_ssdt is set as a cross-check
+        self.log("Building SSDT-HPET.aml...")
+        try:
+            ssdt = aml.AML().build_ssdt_hpet(scope, self.target_irqs)
+        except Exception as e:
+            self.log(" - {} - compiling with iasl instead".format(e))
+            ssdt = None
+        if ssdt == None or self.verify_ssdt:
+            dsl_path = os.path.join(temp,"SSDT-HPET.dsl")
+            with open(dsl_path,"w") as f:
+                f.write(self.get_ssdt_source(scope))
+            check = self.compile_ssdt(dsl_path)
+            if ssdt == None:
+                return check
+            self.log(" - Cross-checking against iasl...")
+            # Skip the checksum and creator revision as those depend on the iasl version
+            if check[:9]+check[10:32] != ssdt[:9]+ssdt[10:32] or check[36:] != ssdt[36:]:
+                self.log(" --> Mismatch - using iasl's output")
+                ssdt = check
+        return ssdt
+
+    def get_iasl_version(self):
+        # Returns the version line from iasl -v - only ran once per session
+        if self.iasl_version == None:
+            out = self.r.run({"args":[self.get_iasl(),"-v"]})
+            self.iasl_version = next((x.strip() for x in out[0].split("\n") if "version" in x.lower()),out[0].strip())
+        return self.iasl_version
+
+    def scan_tables(self, folder):
+        # Reads just the header of every file in folder - returns an
+        # acpi.Table for each that's an ACPI table, whatever it's named, as
+        # long as it isn't a backup copy (SSDT-1.aml.bak, DSDT.orig...)
+        tables = []
+        for x in sorted(os.listdir(folder)):
+            path = os.path.join(folder,x)
+            if x.startswith(".") or not os.path.isfile(path):
+                continue
+            t = acpi.Table(path)
+            if not t.is_dump():
+                continue
+            try:
+                tables.append(t.load())
+            except Exception:
+                pass
+        return tables
+
+    def get_tables(self, path):
+        # Resolves a DSDT or origin folder into the DSDT path and a dict of
+        # SSDT name -> path that iasl can use to resolve externals.  Tables
+        # are told apart by their headers, not their file names.
+        path = os.path.abspath(path)
+        ssdts = {}
+        if os.path.isdir(path):
+            tables = self.scan_tables(path)
+            dsdts = [x.path for x in tables if x.signature == "DSDT"]
+            if not dsdts:
+                raise Exception("Could not locate a DSDT in {}".format(path))
+            # Prefer the one named DSDT.aml if there's more than one
+            named = [x for x in dsdts if os.path.basename(x).lower() == "dsdt.aml"]
+            path = (named or dsdts)[0]
+            hashes = set()
+            for t in tables:
+                name = os.path.basename(t.path)
+                if t.signature != "SSDT" or name.lower().startswith("ssdt-x"):
+                    # Not needed - skip
+                    continue
+                root,ext = os.path.splitext(name)
+                if ext.lower() != ".aml":
+                    # iasl goes by the extension
+                    name = root+".aml"
+                # The same table dumped twice would only clash in iasl
+                table_hash = hashlib.sha256(self.get_table_bytes(t.path)).hexdigest()
+                if not name in ssdts and not table_hash in hashes:
+                    ssdts[name] = t.path
+                    hashes.add(table_hash)
+        elif not os.path.exists(path):
+            raise Exception("Could not locate {}".format(path))
+        else:
+            try:
+                t = acpi.Table(path).load()
+            except Exception as e:
+                raise Exception("{} is not an ACPI table: {}".format(os.path.basename(path),e))
+            if t.signature != "DSDT":
+                raise Exception("The passed file must be a DSDT - {} is {}".format(os.path.basename(path),t.signature))
+        return (path, ssdts)
+
+    def is_table_path(self, table):
+        # SSDTs can be passed as raw bytes or as paths - on Python 2 both are
+        # str though.  Raw tables always have nulls in their 36 byte header
+        # (the length field alone sees to that), and paths never can.
+        if isinstance(table, (bytearray, memoryview)):
+            return False
+        if not isinstance(table, bytes):
+            return True
+        if b"\x00" in table:
+            return False
+        try:
+            return os.path.isfile(table)
+        except Exception:
+            return False
+
+    def get_table_bytes(self, table):
+        if not self.is_table_path(table):
+            return bytes(table)
+        with open(table,"rb") as f:
+            return f.read()
+
+    def load_dsdt(self, dsdt_raw, ssdts, temp):
+        # Returns an indexed listing.Listing for the DSDT - walking the AML
+        # ourselves first, and only falling back on iasl if that fails
+        if self.tables_size:
+            key = [hashlib.sha256(dsdt_raw).hexdigest()]
+            for x in sorted(ssdts):
+                key.extend([x,hashlib.sha256(self.get_table_bytes(ssdts[x])).hexdigest()])
+            key = tuple(key)
+            if key in self.tables:
+                self.log("Using parsed DSDT from memory...")
+                self.log()
+                self.tables[key] = self.tables.pop(key)
+                return self.tables[key]
+        self.log("Walking DSDT.aml and locating HPET...")
+        try:
+            dsdt_index = aml.AML().walk(dsdt_raw)
+            dsdt_index.fallback = lambda: self.get_fallback_listing(dsdt_raw, ssdts)
+            self.log(" - Found HPET _CRS at offset 0x{:X}".format(dsdt_index.hpet_crs))
+        except Exception as e:
+            # Something we couldn't decode - let iasl handle it
+            self.log(" - {} - falling back on iasl".format(e))
+            self.log()
+            dsdt_index = self.get_listing(dsdt_raw, ssdts, temp)
+        self.log()
+        if self.tables_size:
+            self.tables[key] = dsdt_index
+            while len(self.tables) > self.tables_size:
+                self.tables.popitem(last=False)
+        return dsdt_index
+
+    def print_patch(self, patch):
+        self.log(" - {}".format(patch["Comment"]))
+        self.log("      Find: {}".format(patch["Find"]))
+        self.log("   Replace: {}".format(patch["Replace"]))
+        self.log()
+
+    def get_patch_memo(self, dsdt_raw):
+        # Returns the per-device patch memo for this DSDT - starting over
+        # whenever we move on to a different table
+        dsdt_hash = hashlib.sha256(dsdt_raw).hexdigest()
+        if self.patch_memo.get("hash") != dsdt_hash:
+            self.patch_memo = {"hash":dsdt_hash,"sa":None,"crs":None,"devs":{}}
+        return self.patch_memo
+
+    def build_patches(self, dsdt_index, dsdt_raw, policies):
+        # Works out the _CRS rename and the IRQ patches for every device and
+        # IRQ selection in the passed policies that we haven't seen yet.  This
+        # doesn't print anything so it can run in the background - get_patches
+        # assembles and prints the results.
+        with self.patch_lock:
+            memo = self.get_patch_memo(dsdt_raw)
+            try:
+                return self._build_patches(memo, dsdt_index, dsdt_raw, policies)
+            finally:
+                # Any suffix array is only shared by the patches of this pass
+                memo["sa"] = None
+
+    def _build_patches(self, memo, dsdt_index, dsdt_raw, policies):
+        if memo["crs"] == None:
+            pad = self.get_unique_pad(self._crs, dsdt_index, dsdt_raw, dsdt_index.hpet_crs, memo)
+            memo["crs"] = {"Comment":"HPET _CRS to XCRS Rename","Find":self._crs+pad,"Replace":self.xcrs+pad}
+
+        # Gather every candidate Find for every device and ending, and
+        # locate them all with a single pass over the table
+        devs = dsdt_index.devices
+        todo = {}
+        for target_irqs in policies:
+            for dev in devs:
+                if not dev in target_irqs:
+                    continue
+                key = (dev,tuple(sorted(set(target_irqs[dev]))))
+                if key in memo["devs"] or key in todo:
+                    continue
+                todo[key] = (devs[dev],target_irqs[dev])
+        if not todo:
+            return memo
+        dev_patches = self.get_hex_from_irqs_batch(todo)
+        found = self.find_irq_patches(dev_patches, dsdt_raw)
+
+        for key in dev_patches:
+            try:
+                memo["devs"][key] = self.get_dev_patches(key[0], dev_patches[key], found, dsdt_index, dsdt_raw, memo)
+            except Exception as e:
+                # Hold onto the error so whoever asks for this device gets it
+                memo["devs"][key] = e
+        # Give anything the walker's offsets couldn't place another go
+        # against iasl's listing of the same table
+        retry = [key for key in dev_patches if isinstance(memo["devs"][key], Exception)]
+        fallback = self.get_fallback_index(dsdt_index) if retry and dsdt_index.raw_spans else None
+        if not fallback:
+            return memo
+        todo = dict([(key,(fallback.devices[key[0]],todo[key][1])) for key in retry if key[0] in fallback.devices])
+        if not todo:
+            return memo
+        dev_patches = self.get_hex_from_irqs_batch(todo)
+        found = self.find_irq_patches(dev_patches, dsdt_raw)
+        for key in dev_patches:
+            try:
+                memo["devs"][key] = self.get_dev_patches(key[0], dev_patches[key], found, fallback, dsdt_raw, memo)
+            except Exception as e:
+                memo["devs"][key] = e
+        return memo
+
+    def get_dev_patches(self, dev, dev_patches, found, dsdt_index, dsdt_raw, memo = None):
+        # Returns the patches for one device's changed IRQs - with None in place
+        # of any that are missing an IRQ ending
+        entries = []
+        i = [x for x in dev_patches if x["changed"]]
+        for a,t in enumerate(i):
+            ending = self.get_irq_ending(t, found, dsdt_raw)
+            if not ending:
+                entries.append(None)
+                continue
+            if len(found[self.get_hex_bytes(t["find"]+ending)]) == 1:
+                # Already unique - no pad needed
+                pad = ""
+            else:
+                pad = self.get_unique_pad(t["find"]+ending, dsdt_index, dsdt_raw, t["index"], memo)
+            t_patch = t["find"]+ending+pad
+            r_patch = t["repl"]+ending+pad
+            name = "{} IRQ {} Patch".format(dev, t["irq"])
+            if len(i) > 1:
+                name += "Patch {} of {}".format(a+1, len(i))
+            entries.append({"Comment":name,"Find":t_patch,"Replace":r_patch})
+        return entries
+
+    def get_irq_ending(self, t, found, dsdt_raw):
+        # Where we know the descriptors' raw offset the ending is whatever
+        # follows them - otherwise try our endings here - 7900, 8609, and 4701
+        if t["end"] != -1:
+            ending = binascii.hexlify(dsdt_raw[t["end"]:t["end"]+2]).decode("utf-8").upper()
+            return ending if ending in self.irq_endings else None
+        return next((x for x in self.irq_endings if len(found[self.get_hex_bytes(t["find"]+x)])),None)
+
+    def get_fallback_index(self, dsdt_index):
+        # Returns iasl's listing of a DSDT the walker indexed - made once, and
+        # only for patches the walker's offsets couldn't place.  None if it
+        # isn't a walker index or iasl can't help.
+        if dsdt_index.fallback_index == None and dsdt_index.fallback:
+            try:
+                dsdt_index.fallback_index = dsdt_index.fallback()
+            except Exception as e:
+                self.log(" - {}".format(e))
+            dsdt_index.fallback = None
+        return dsdt_index.fallback_index
+
+    def get_fallback_listing(self, dsdt_raw, ssdts):
+        # The walker's temp folder is long gone by the time this is needed
+        temp = self.w.create()
+        try:
+            return self.get_listing(dsdt_raw, ssdts, temp)
+        finally:
+            self.w.remove(temp)
+
+    def speculate(self, spec, dsdt_raw, ssdts, temp):
+        # Runs on a background thread while the IRQ menu is up - loading the
+        # DSDT if needed and working out the patches for C, O and L so they're
+        # ready by the time a choice is made.  Errors are left for the
+        # foreground to hit and report.
+        self.local.quiet = True
+        try:
+            if spec["index"] == None:
+                spec["index"] = self.load_dsdt(dsdt_raw, ssdts, temp)
+            devs = spec["index"].devices
+            self.build_patches(spec["index"], dsdt_raw, [self.get_policy(x, devs) for x in ("c","o","l")])
+        except:
+            pass
+
+    def get_patches(self, dsdt_index, dsdt_raw, target_irqs):
+        # Builds the _CRS rename and IRQ patches for the passed selection -
+        # returns the patches and a list of devices missing an IRQ ending
+        self.log("Verifying hex data is unique...")
+        self.log()
+        memo = self.build_patches(dsdt_index, dsdt_raw, [target_irqs])
+        patches = [memo["crs"]]
+        missing = []
+        self.print_patch(patches[0])
+        self.log("Checking IRQs...")
+        self.log()
+        for dev in dsdt_index.devices:
+            if not dev in target_irqs:
+                continue
+            entries = memo["devs"][(dev,tuple(sorted(set(target_irqs[dev]))))]
+            if isinstance(entries, Exception):
+                raise entries
+            for patch in entries:
+                if patch == None:
+                    self.log("Missing IRQ Patch ending for {}! Skipping...".format(dev))
+                    missing.append(dev)
+                    continue
+                patches.append(patch)
+                self.print_patch(patch)
+        return (patches, missing)
+
+    def get_scope(self):
+        print("")
+        print("Could not locate LPCB or LPC in DSDT!")
+        print("")
+        while True:
+            scope = self.u.grab("Please enter the device that HPET is attached to in your DSDT (eg. LPCB or LPC):  ")
+            if not len(scope):
+                continue
+            try:
+                return self.check_scope(scope)
+            except Exception as e:
+                print(" - {}".format(e))
+
+    def check_scope(self, scope):
+        # The scope ends up in the SSDT's source - keep it to a device name
+        if " " in scope:
+            raise Exception("the device name cannot have spaces")
+        return scope
+
+    def get_plists(self, patches):
+        # Returns the OC and Clover plist dicts for the passed patches
+        oc_plist = {"ACPI":{"Patch":[]}}
+        cl_plist = {"ACPI":{"DSDT":{"Patches":[]}}}
+        # Add the SSDT to the dicts
+        oc_plist["ACPI"]["Add"] = [{"Comment":"HPET _CRS (Needs _CRS to XCRS Rename)","Enabled":True,"Path":"SSDT-HPET.aml"}]
+        cl_plist["ACPI"]["SortedOrder"] = ["SSDT-HPET.aml"]
+        # Iterate the patches
+        for p in patches:
+            oc_plist["ACPI"]["Patch"].append(self.get_oc_patch(p))
+            cl_plist["ACPI"]["DSDT"]["Patches"].append(self.get_clover_patch(p))
+        return (oc_plist, cl_plist)
+
+    def run_stages(self, stages, o_folder = None):
+        # Runs each file name -> function on its own thread, saving each file
+        # into o_folder as soon as it's ready.  Returns dicts of file name ->
+        # bytes and name -> seconds taken, raising the first error once all
+        # of the stages are done.
+        files,timings,errors = {},{},[]
+        def run(name, func):
+            start = time.time()
+            try:
+                files[name] = func()
+                if o_folder:
+                    self.atomic.write(os.path.join(o_folder,name), files[name])
+            except Exception as e:
+                errors.append(e)
+            timings[name] = time.time()-start
+        threads = [threading.Thread(target=run,args=(x,stages[x])) for x in stages]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+        return (files, timings)
+
+    def print_timings(self, timings):
+        # Shows how long each stage took - the output stages run side by side,
+        # so the critical path is the patches plus the slowest of them
+        outputs = [x for x in timings if x != "patches"]
+        slowest = max(outputs, key=timings.get)
+        self.log("Stage timings:")
+        for x in ["patches"]+sorted(outputs):
+            self.log(" - {}: {:.1f}ms{}".format(x,timings[x]*1000," (critical path)" if x in ("patches",slowest) else ""))
+        self.log(" - total: {:.1f}ms".format((timings["patches"]+timings[slowest])*1000))
+
+    def get_result(self, dsdt_index, dsdt_raw, target_irqs, scope, temp, o_folder = None):
+        # Builds the full result dict for an indexed DSDT and IRQ selection -
+        # saving the files to o_folder as they're built if passed
+        start = time.time()
+        patches,missing = self.get_patches(dsdt_index, dsdt_raw, target_irqs)
+        timings = {"patches":time.time()-start}
+        oc_plist,cl_plist = self.get_plists(patches)
+        source = self.get_ssdt_source(scope)
+        if o_folder:
+            if not os.path.isdir(o_folder):
+                os.makedirs(o_folder)
+            self.log("")
+            self.log("Writing SSDT-HPET.dsl/.aml with scope _SB.PCIO.{}".format(scope))
+            self.log("Building patches_OC and patches_Clover plists...")
+        # None of the outputs depend on each other - so the SSDT (and any
+        # iasl compile) runs alongside serializing the plists
+        files,stage_timings = self.run_stages({
+            "SSDT-HPET.dsl": lambda: source.encode("utf-8"),
+            "SSDT-HPET.aml": lambda: self.get_ssdt(scope, temp),
+            "patches_OC.plist": lambda: plist.dumps(oc_plist).encode("utf-8"),
+            "patches_Clover.plist": lambda: plist.dumps(cl_plist).encode("utf-8")
+        }, o_folder)
+        timings.update(stage_timings)
+        devs = dsdt_index.devices
+        result = {
+            "hpet_crs": dsdt_index.hpet_crs,
+            "devices": dict([(x,self.get_all_irqs(devs[x])) for x in devs]),
+            "irqs": target_irqs,
+            "scope": scope,
+            "patches": patches,
+            "missing": missing,
+            "ssdt_source": source,
+            "ssdt": files["SSDT-HPET.aml"],
+            "oc_plist": oc_plist,
+            "cl_plist": cl_plist,
+            "files": files,
+            "timings": timings
+        }
+        if o_folder:
+            result["paths"] = [os.path.join(o_folder,x) for x in self.result_files]
+        return result
+
+    def analyze(self, dsdt_raw, ssdts = None, policy = "c", scope = None):
+        # Headless API - takes the raw DSDT bytes, an optional dict of SSDT
+        # name -> bytes (or path) only used if we need iasl, and a menu policy
+        # (C, O, L, a custom list, or a dict of device -> IRQs).  Returns the
+        # result dict without prompting or touching the Results folder.
+        temp = self.w.create()
+        try:
+            dsdt_index = self.load_dsdt(dsdt_raw, ssdts or {}, temp)
+            if not isinstance(policy, dict):
+                policy = self.get_policy(policy, dsdt_index.devices)
+            scope = scope or dsdt_index.get_scope()
+            if not scope:
+                raise Exception("Could not locate LPCB or LPC in DSDT - a scope must be provided")
+            self.check_scope(scope)
+            return self.get_result(dsdt_index, dsdt_raw, policy, scope, temp)
+        finally:
+            self.w.remove(temp)
+
+    def save_result(self, result, o_folder):
+        # Writes the result's files to o_folder and returns their paths
+        if not os.path.isdir(o_folder):
+            os.makedirs(o_folder)
+        return [self.atomic.write(os.path.join(o_folder,x), result["files"][x]) for x in self.result_files]
+
+    def get_summary_key(self, dsdt_hash):
+        # Versioned so summaries from before the IRQ records, offset indexes
+        # and SSDT keys are ignored
+        return self.summary_cache.get_key("summary",4,dsdt_hash)
+
+    def get_ssdt_key(self, dsdt_raw, ssdts):
+        # The name and hash of each SSDT iasl would be handed for this DSDT -
+        # anything built from its listing is only good while these match
+        needed = self.get_needed_ssdts(dsdt_raw, ssdts)
+        return [[x,hashlib.sha256(self.get_table_bytes(needed[x])).hexdigest()] for x in sorted(needed)]
+
+    def get_summary(self, dsdt_hash, ssdt_key):
+        # Returns the cached device -> IRQs map and scope for a DSDT, or None.
+        # Summaries built from an iasl listing also need the same SSDTs.
+        summary = self.summary_cache.get(self.get_summary_key(dsdt_hash))
+        if summary == None:
+            return None
+        summary = json.loads(summary.decode("utf-8"))
+        if summary["ssdts"] != None and summary["ssdts"] != ssdt_key:
+            return None
+        devs = summary["devices"]
+        summary["devices"] = dict([(x,[irq.IRQ().from_list(y) for y in devs[x]]) for x in devs])
+        return summary
+
+    def put_summary(self, dsdt_hash, dsdt_index, ssdt_key):
+        # Walked indexes never saw the SSDTs, so only listings keep their key
+        devs = dsdt_index.devices
+        summary = {
+            "devices":dict([(x,[y.to_list() for y in devs[x]]) for x in devs]),
+            "scope":dsdt_index.get_scope(),
+            "ssdts":None if dsdt_index.raw_spans else ssdt_key
+        }
+        self.summary_cache.put(self.get_summary_key(dsdt_hash),json.dumps(summary).encode("utf-8"))
+        return {"devices":devs,"scope":summary["scope"],"ssdts":summary["ssdts"]}
+
+    def get_result_key(self, dsdt_hash, target_irqs, scope, ssdt_key = None):
+        return self.result_cache.get_key("result",dsdt_hash,json.dumps(target_irqs,sort_keys=True),scope,self.get_ssdt_source(scope),json.dumps(ssdt_key))
+
+    def get_cached_result(self, key):
+        # Returns a cached result with its files as bytes, or None
+        cached = self.result_cache.get(key)
+        if cached == None:
+            return None
+        cached = json.loads(cached.decode("utf-8"))
+        result = cached.get("result",{"patches":cached.get("patches",[])})
+        result["files"] = dict([(x,base64.b64decode(cached["files"][x])) for x in cached["files"]])
+        result["cached"] = True
+        return result
+
+    def put_cached_result(self, key, result):
+        files = result["files"]
+        cached = {
+            "result": self.get_result_json(result),
+            "files": dict([(x,base64.b64encode(files[x]).decode("utf-8")) for x in files])
+        }
+        self.result_cache.put(key,json.dumps(cached).encode("utf-8"))
+
+    def get_result_json(self, result):
+        # Strips the bytes and plist dicts leaving a JSON-friendly summary
+        keys = ("hpet_crs","devices","irqs","scope","patches","missing","cached")
+        return dict([(x,result[x]) for x in keys if x in result])
+
+    def process(self, path, policy = "c", scope = None, o_folder = None):
+        # Runs the whole pipeline headless on a DSDT.aml or origin folder, using
+        # the result cache where possible, and saves the files to o_folder
+        dsdt,ssdts = self.get_tables(path)
+        with open(dsdt,"rb") as f:
+            dsdt_raw = f.read()
+        dsdt_hash = hashlib.sha256(dsdt_raw).hexdigest()
+        o_folder = o_folder or self.check_output()
+        temp = self.w.create()
+        try:
+            dsdt_index = None
+            ssdt_key = self.get_ssdt_key(dsdt_raw, ssdts)
+            summary = self.get_summary(dsdt_hash, ssdt_key)
+            if summary == None:
+                dsdt_index = self.load_dsdt(dsdt_raw, ssdts, temp)
+                summary = self.put_summary(dsdt_hash, dsdt_index, ssdt_key)
+            target_irqs = policy if isinstance(policy, dict) else self.get_policy(policy, summary["devices"])
+            scope = scope or summary["scope"]
+            if not scope:
+                raise Exception("Could not locate LPCB or LPC in DSDT - a scope must be provided")
+            self.check_scope(scope)
+            key = self.get_result_key(dsdt_hash, target_irqs, scope, summary["ssdts"])
+            result = self.get_cached_result(key)
+            if result == None:
+                if dsdt_index == None:
+                    dsdt_index = self.load_dsdt(dsdt_raw, ssdts, temp)
+                result = self.get_result(dsdt_index, dsdt_raw, target_irqs, scope, temp, o_folder)
+                self.put_cached_result(key, result)
+            else:
+                result["paths"] = self.save_result(result, o_folder)
+            return result
+        finally:
+            self.w.remove(temp)
+
+    def get_needed_ssdts(self, dsdt_raw, ssdts):
+        # Only SSDTs that define something the DSDT mentions can help iasl
+        # resolve its externals - the rest just slow the decompile down
+        a = aml.AML()
+        needed = {}
+        for x in sorted(ssdts):
+            names = a.get_defined_names(self.get_table_bytes(ssdts[x]))
+            if any(n in dsdt_raw for n in names):
+                needed[x] = ssdts[x]
+        return needed
+
+    def get_listing(self, dsdt_raw, ssdts, temp):
+        # Creates a mixed listing of the DSDT with iasl (using the SSDTs it
+        # needs to resolve externals) and returns the indexed listing.Listing.
+        # Should the trimmed set of SSDTs not cut it, every SSDT is used.
+        needed = self.get_needed_ssdts(dsdt_raw, ssdts)
+        if len(needed) < len(ssdts):
+            self.log("Skipping {:,} of {:,} SSDTs the DSDT doesn't reference...".format(len(ssdts)-len(needed),len(ssdts)))
+            try:
+                return self._get_listing(dsdt_raw, needed, temp)
+            except Exception as e:
+                self.log(" - {} - retrying with every SSDT".format(e))
+        return self._get_listing(dsdt_raw, ssdts, temp)
+
+    def _get_listing(self, dsdt_raw, ssdts, temp):
+        # Listings are cached on the table contents and the iasl version
+        key_parts = [self.get_iasl_version(),"DSDT.aml",hashlib.sha256(dsdt_raw).hexdigest()]
+        for x in sorted(ssdts):
+            key_parts.extend([x,hashlib.sha256(self.get_table_bytes(ssdts[x])).hexdigest()])
+        key = self.decompile_cache.get_key(*key_parts)
+        # Index the listing once - every later lookup goes through it.  Cached
+        # listings are unpacked next to where iasl would have left one, so
+        # they're mapped and indexed the same way.
+        dsdt_l_path = self.decompile_cache.get_file(key, os.path.join(temp,"DSDT-cached.dsl"))
+        if dsdt_l_path != None:
+            self.log("Using cached mixed listing...")
+            dsdt_index = self.load_listing(dsdt_l_path)
+        else:
+            dsdt_l_path = self.decompile(dsdt_raw, ssdts, temp)
+            self.decompile_cache.put_file(key, dsdt_l_path)
+            dsdt_index = self.load_listing(dsdt_l_path)
+        if dsdt_index.hpet_crs == -1:
+            raise Exception("Could not locate HPET _CRS!")
+        self.log(" - Found HPET _CRS at index {}".format(dsdt_index.hpet_crs))
+        return dsdt_index
+
+    def decompile(self, dsdt_raw, ssdts, temp):
+        # Places the tables in temp and returns the path to iasl's mixed
+        # listing - SSDTs we have paths for are linked rather than copied
+        self.log("Copying to temp folder...")
+        temp = tempfile.mkdtemp(dir=temp)
+        dsdt_path = os.path.join(temp,"DSDT.aml")
+        with open(dsdt_path,"wb") as f:
+            f.write(dsdt_raw)
+        for x in sorted(ssdts):
+            self.log(" - {}...".format(x))
+            if self.is_table_path(ssdts[x]):
+                self.w.link(ssdts[x],os.path.join(temp,x))
+            else:
+                with open(os.path.join(temp,x),"wb") as f:
+                    f.write(ssdts[x])
+        dsdt_l_path = os.path.splitext(dsdt_path)[0]+".dsl"
+
+        self.log()
+        self.log("Creating a mixed listing file...")
+        # Any SSDTs are passed along to resolve externals - without them the
+        # listing might be incomplete though
+        args = [self.get_iasl(),"-da","-dl","-l","DSDT.aml"]+sorted(ssdts)
+        cwd = os.getcwd()
+        os.chdir(temp)
+        out = self.r.run({"args":args})
+        os.chdir(cwd)
+
+        if out[2] != 0 or not os.path.exists(dsdt_l_path):
+            raise Exception("Failed to decompile DSDT.aml")
+
+        self.log()
+        self.log("Loading {} and locating HPET...".format(os.path.basename(dsdt_l_path)))
+        return dsdt_l_path
+
+    def load_listing(self, path):
+        # Maps the listing into memory rather than reading it in - lines are
+        # only decoded as the index asks for them, and the map is closed once
+        # the runs the index needs are held so cached indexes don't keep the
+        # file around.  Windows won't let us clean up a mapped file, and empty
+        # files can't be mapped, so those are streamed through the index a
+        # line at a time instead.
+        with open(path,"rb") as f:
+            if os.name != "nt" and os.path.getsize(path):
+                try:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (mmap.error, ValueError, OSError):
+                    pass
+                else:
+                    try:
+                        return listing.Listing(data, path).detach()
+                    finally:
+                        data.close()
+            return listing.Listing().index_stream(f)
+
     def main(self):
         cwd = os.getcwd()
-        self.iasl = self.check_iasl()
-        if not self.iasl:
-            # didn't find it - couldn't download it - bail
-            exit(1)
+        # Interactive - show the progress as we go
+        self.quiet = False
+        # Get iasl sorted while we wait on the prompts - we only block on it
+        # if we end up needing it
+        self.provision_iasl()
         self.u.head()
         print("")
-        got_origin = False
-        origin_path = ""
         while True:
             dsdt = self.u.grab("Please drag and drop your origin folder or DSDT.aml here:  ")
             dsdt = self.u.check_path(dsdt)
             if not dsdt:
                 print(" - I couldn't find that file/folder!")
                 continue
-            if os.path.isdir(dsdt):
-                # Check for DSDT.aml inside
-                if os.path.exists(os.path.join(dsdt,"DSDT.aml")):
-                    origin_path = dsdt
-                    got_origin = True
-                    dsdt = os.path.join(dsdt,"DSDT.aml")
-                else:
-                    print(" - I couldn't locate a DSDT.aml in that folder!")
-                    continue
-            elif os.path.basename(dsdt).lower() != "dsdt.aml":
-                print(" - The dropped file must be DSDT.aml!")
+            try:
+                # Only reads the table headers - cheap enough to check here
+                self.get_tables(dsdt)
+            except Exception as e:
+                print(" - {}!".format(e))
                 continue
             print("")
             break
-        temp = tempfile.mkdtemp()
+        temp = self.w.create()
         try:
-            # Should have a DSDT - try and decompile it with the `-l` flag
-            print("Copying to temp folder...")
-            if got_origin:
-                got_origin = False # Reset until we get an SSDT file copied
-                for x in os.listdir(origin_path):
-                    if x.startswith(".") or x.lower().startswith("ssdt-x") or not x.lower().endswith(".aml"):
-                        # Not needed - skip
-                        continue
-                    if x.lower().startswith("ssdt"):
-                        got_origin = True # Got at least one - nice
-                    print(" - {}...".format(x))
-                    shutil.copy(os.path.join(origin_path,x),temp)
-                dsdt_path = os.path.join(temp,"DSDT.aml")
-            else:
-                print(" - {}...".format(os.path.basename(dsdt)))
-                shutil.copy(dsdt,temp)
-                dsdt_path = os.path.join(temp,os.path.basename(dsdt))
-            dsdt_l_path = os.path.splitext(dsdt_path)[0]+".dsl"
-            
-            print("")
-            print("Creating a mixed listing file...")
-            os.chdir(temp)
-            if got_origin:
-                # Have at least one SSDT to use while decompiling
-                out = self.r.run({"args":"{} -da -dl -l DSDT.aml SSDT*".format(self.iasl),"shell":True})
-            else:
-                # Just the DSDT - might be incomplete though
-                out = self.r.run({"args":[self.iasl,"-da","-dl","-l",dsdt_path]})
-            
-            if out[2] != 0 or not os.path.exists(dsdt_l_path):
-                raise Exception("Failed to decompile {}".format(os.path.basename(dsdt_path)))
-            
-            print("")
-            print("Loading {} and locating HPET...".format(os.path.basename(dsdt_l_path)))
-            with open(dsdt_l_path,"r") as f:
-                dsdt_c = f.read()
-                dsdt_contents = dsdt_c.split("\n")
-            hpet_crs = self.find_hpet_crs(dsdt_contents)
-            if hpet_crs == -1:
-                raise Exception("Could not locate HPET _CRS!")
-            print(" - Found HPET _CRS at index {}".format(hpet_crs))
-
-            print("")
-            print("Loading {} and verifying hex data is unique...".format(os.path.basename(dsdt_path)))
-            with open(dsdt_path,"rb") as f:
+            dsdt,ssdts = self.get_tables(dsdt)
+            with open(dsdt,"rb") as f:
                 dsdt_raw = f.read()
+            dsdt_hash = hashlib.sha256(dsdt_raw).hexdigest()
+            dsdt_index = None
+            # Check if we've already analyzed this DSDT
+            ssdt_key = self.get_ssdt_key(dsdt_raw, ssdts)
+            summary = self.get_summary(dsdt_hash, ssdt_key)
+            if summary == None:
+                dsdt_index = self.load_dsdt(dsdt_raw, ssdts, temp)
+                summary = self.put_summary(dsdt_hash, dsdt_index, ssdt_key)
 
-            pad = self.get_unique_pad(self._crs, dsdt_contents, dsdt_raw, hpet_crs)
-            patches = [{"Comment":"HPET _CRS to XCRS Rename","Find":self._crs+pad,"Replace":self.xcrs+pad}]
+            # Work out the patches for the built-in options while the menu is up
+            spec = {"index":dsdt_index}
+            t = threading.Thread(target=self.speculate, args=(spec, dsdt_raw, ssdts, temp))
+            t.daemon = True
+            t.start()
 
             # Now we verify our IRQ checks
-            devs = self.list_irqs(dsdt_contents)
-            target_irqs = self.get_irq_choice(devs)
+            target_irqs = self.get_irq_choice(summary["devices"])
+            self.scope = summary["scope"] or self.get_scope()
 
             self.u.head("Creating IRQ Patches")
-            print("")
-            print(" - HPET _CRS to XCRS Rename:")
-            print("      Find: {}".format(self._crs+pad))
-            print("   Replace: {}".format(self.xcrs+pad))
-            print("")
-            print("Checking IRQs...")
-            print("")
-
-            for dev in devs:
-                if not dev in target_irqs:
-                    continue
-                irq_patches = self.get_hex_from_irqs(devs[dev],target_irqs[dev])
-                i = [x for x in irq_patches if x["changed"]]
-                for a,t in enumerate(i):
-                    if not t["changed"]:
-                        # Nothing patched - skip
-                        continue
-                    # Try our endings here - 7900, 8609, and 4701
-                    ending = None
-                    for x in ["7900","8609","4701"]:
-                        t_bytes = binascii.unhexlify(t["find"]+x)
-                        if t_bytes in dsdt_raw:
-                            ending = x
-                            break
-                    if not ending:
-                        print("Missing IRQ Patch ending for {}! Skipping...".format(dev))
-                        continue
-                    pad = self.get_unique_pad(t["find"]+ending, dsdt_contents, dsdt_raw, t["index"])
-                    t_patch = t["find"]+ending+pad
-                    r_patch = t["repl"]+ending+pad
-                    name = "{} IRQ {} Patch".format(dev, t["irq"])
-                    if len(i) > 1:
-                        name += "Patch {} of {}".format(a+1, len(i))
-                    patches.append({"Comment":name,"Find":t_patch,"Replace":r_patch})
-                    print(" - {}".format(name))
-                    print("      Find: {}".format(t_patch))
-                    print("   Replace: {}".format(r_patch))
-                    print("")
-
-            if "PCI0.LPCB" in dsdt_c:
-                self.scope = "LPCB"
-            elif "PCI0.LPC" in dsdt_c:
-                self.scope = "LPC"
-            
-            if not self.scope:
-                print("")
-                print("Could not locate LPCB or LPC in DSDT!")
-                print("")
-                while True:
-                    self.scope = self.u.grab("Please enter the device that HPET is attached to in your DSDT (eg. LPCB or LPC):  ")
-                    if not len(self.scope):
-                        continue
-                    if " " in self.scope:
-                        print(" - the device name cannot have spaces")
-                        continue
-                    break
-
             print("")
             os.chdir(os.path.dirname(os.path.realpath(__file__)))
             o_folder = self.check_output()
-            print("Writing SSDT-HPET.dsl with scope _SB.PCIO.{}".format(self.scope))
-            with open(os.path.join(o_folder,"SSDT-HPET.dsl"),"w") as f:
-                f.write(self.ssdt_source.replace("[[scope]]",self.scope))
-            print("")
-            print("Compiling...")
-            out = self.r.run({"args":[self.iasl,os.path.join(o_folder,"SSDT-HPET.dsl")]})
-            if out[2] != 0 or not os.path.exists(dsdt_l_path):
-                raise Exception("Failed to compile SSDT-HPET.dsl!")
-            print("")
-
-            # Save a patches_OC.plist and patches_Clover.plist file with our info
-            print("Building patches_OC and patches_Clover plists...")
-            oc_plist = {"ACPI":{"Patch":[]}}
-            cl_plist = {"ACPI":{"DSDT":{"Patches":[]}}}
-            # Add the SSDT to the dicts
-            oc_plist["ACPI"]["Add"] = [{"Comment":"HPET _CRS (Needs _CRS to XCRS Rename)","Enabled":True,"Path":"SSDT-HPET.aml"}]
-            cl_plist["ACPI"]["SortedOrder"] = ["SSDT-HPET.aml"]
-            # Iterate the patches
-            for p in patches:
-                oc_plist["ACPI"]["Patch"].append(self.get_oc_patch(p))
-                cl_plist["ACPI"]["DSDT"]["Patches"].append(self.get_clover_patch(p))
-
-            # Write the plists
-            with open(os.path.join(o_folder,"patches_OC.plist"),"wb") as f:
-                plist.dump(oc_plist,f)
-            with open(os.path.join(o_folder,"patches_Clover.plist"),"wb") as f:
-                plist.dump(cl_plist,f)
+            key = self.get_result_key(dsdt_hash, target_irqs, self.scope, summary["ssdts"])
+            result = self.get_cached_result(key)
+            if result != None:
+                # Same DSDT, IRQs and scope as a prior run - just restore the files
+                for p in result["patches"]:
+                    self.print_patch(p)
+                print("Restoring cached results...")
+                self.save_result(result, o_folder)
+            else:
+                # Only now do we need whatever the speculation got done
+                t.join()
+                dsdt_index = spec["index"]
+                if dsdt_index == None:
+                    dsdt_index = self.load_dsdt(dsdt_raw, ssdts, temp)
+                result = self.get_result(dsdt_index, dsdt_raw, target_irqs, self.scope, temp, o_folder)
+                print("")
+                self.print_timings(result["timings"])
+                self.put_cached_result(key, result)
 
             print("")
             print("Done.")
@@ -542,9 +1159,332 @@ DefinitionBlock ("", "SSDT", 2, "hack", "HPET", 0x00000000)
         except Exception as e:
             print("An error occurred :(\n - {}".format(e))
             pass
-        shutil.rmtree(temp,ignore_errors=True)
+        self.w.remove(temp)
         os.chdir(cwd)
-            
+
+    def get_item(self, path, policy, scope, o_folder):
+        # Runs process() on one batch entry and returns its report row - any
+        # error is recorded rather than raised so one bad dump can't stop the run
+        row = {"path":path,"output":o_folder}
+        try:
+            result = self.process(path, policy, scope, o_folder)
+            row.update(self.get_result_json(result))
+            row.update({"status":"ok","paths":result["paths"]})
+        except Exception as e:
+            row.update({"status":"error","error":str(e)})
+        return row
+
+    def get_input_hash(self, path, policy, scope):
+        # Hashes the tables at path along with the settings they'll be run with
+        dsdt,ssdts = self.get_tables(path)
+        parts = [json.dumps(policy,sort_keys=True),scope or ""]
+        for name,table in [("DSDT.aml",dsdt)]+sorted(ssdts.items()):
+            parts.extend([name,hashlib.sha256(self.get_table_bytes(table)).hexdigest()])
+        return self.result_cache.get_key(*parts)
+
+    def run_batch(self, root, policy = "c", scope = None, o_folder = None, processes = None, fresh = False):
+        # Runs every folder under root that holds a DSDT through process()
+        # across a process pool, saving each to a matching folder in o_folder,
+        # and writes an aggregated report.json/report.csv alongside them.
+        # Finished folders are checkpointed in journal.jsonl so a rerun only
+        # picks up what failed or never finished - unless fresh is set.
+        root = os.path.abspath(root)
+        o_folder = os.path.abspath(o_folder or self.check_output())
+        b = batch.Batch(processes)
+        folders = b.find(root)
+        if not folders:
+            raise Exception("Could not locate any DSDTs in {}".format(root))
+        # Hand the workers iasl if it's already here - the walker may well
+        # handle every folder, and any worker that does need it downloads it
+        # under a lock
+        self.iasl = self.iasl or self.check_iasl(download=False)
+        j = journal.Journal(os.path.join(o_folder,"journal.jsonl")).open(fresh)
+        items = []
+        hashes = {}
+        results = []
+        skipped = 0
+        for x in folders:
+            rel = os.path.relpath(x,root)
+            try:
+                hashes[x] = self.get_input_hash(x, policy, scope)
+            except Exception as e:
+                results.append({"path":x,"status":"error","error":str(e)})
+                continue
+            if j.is_done(x, hashes[x]) and all(os.path.exists(y) for y in j.entries[x].get("paths",[])):
+                # Already finished with the same inputs - reuse the journaled row
+                results.append(dict((k,v) for k,v in j.entries[x].items() if not k in ("key","hash")))
+                skipped += 1
+                continue
+            items.append((x,policy,scope,os.path.join(o_folder,os.path.basename(root) if rel == "." else rel)))
+        if skipped:
+            self.log("Skipping {:,} already finished folder{}...".format(skipped,"" if skipped==1 else "s"))
+        self.log("Processing {:,} folder{} with {:,} process{}...".format(len(items),"" if len(items)==1 else "s",b.processes,"" if b.processes==1 else "es"))
+        try:
+            for a,row in enumerate(b.run(items, _get_item, _init_worker, (self.iasl,))):
+                results.append(row)
+                entry = {"key":row["path"],"hash":hashes[row["path"]]}
+                entry.update(row)
+                j.append(entry)
+                self.log(" - [{}/{}] {}: {}".format(a+1,len(items),os.path.relpath(row["path"],root),row.get("error",row["status"])))
+        finally:
+            j.close()
+        # Keep the report in a stable order regardless of completion order
+        results.sort(key=lambda x:x["path"])
+        if not os.path.isdir(o_folder):
+            os.makedirs(o_folder)
+        report = [b.write_json(results,os.path.join(o_folder,"report.json")),b.write_csv(results,os.path.join(o_folder,"report.csv"))]
+        return (results, report)
+
+    def run_watch(self, path, policy = "c", scope = None, o_folder = None, interval = 1):
+        # Polls an origin folder every interval seconds and reruns process()
+        # whenever DSDT.aml's contents change.  SSDTs only matter to iasl when
+        # resolving externals, so changes to them alone keep the prior results
+        # unless those came from a listing fed by a different set of SSDTs.
+        path = os.path.abspath(path)
+        if not os.path.isdir(path):
+            raise Exception("--watch needs an origin folder")
+        w = watch.Watch()
+        self.quiet = True
+        # Keep a few parsed DSDTs around in case the dumps flip back and forth
+        self.tables_size = max(self.tables_size,4)
+        dsdt_path = os.path.join(path,"DSDT.aml")
+        tables = None
+        last = None
+        print("Watching {} - Ctrl+C to stop".format(path))
+        while True:
+            try:
+                tables = self.get_tables(path)
+                dsdt_path = tables[0]
+                paths = [dsdt_path]+list(tables[1].values())
+            except:
+                # No DSDT.aml right now - mid re-dump most likely - so keep
+                # watching the SSDTs we already know about
+                tables = None
+                paths = [x for x in w.stats if x != dsdt_path]
+            changed = w.poll(paths)
+            if changed:
+                print("")
+                print("{} changed: {}".format(time.strftime("%H:%M:%S"),", ".join(os.path.basename(x) for x in changed)))
+                if not dsdt_path in changed and last != None and self.ssdts_unused(last, tables):
+                    print(" - Only SSDTs changed - keeping the previous results")
+                elif not dsdt_path in w.hashes:
+                    print(" - Waiting for DSDT.aml...")
+                else:
+                    try:
+                        result = self.process(path, policy, scope, o_folder)
+                        last = w.hashes[dsdt_path]
+                        print(" - {}Saved {:,} patch{} to {}".format("(cached) " if result.get("cached") else "",len(result["patches"]),"" if len(result["patches"])==1 else "es",os.path.dirname(result["paths"][0])))
+                    except Exception as e:
+                        last = None
+                        print(" - An error occurred :(\n   - {}".format(e))
+            time.sleep(interval)
+
+    def ssdts_unused(self, dsdt_hash, tables):
+        # True if the cached summary for this DSDT still holds with the SSDTs
+        # in tables - always for walked DSDTs, and for iasl listings only if
+        # the SSDTs it was decompiled with are unchanged
+        if tables == None:
+            return False
+        try:
+            with open(tables[0],"rb") as f:
+                dsdt_raw = f.read()
+            if hashlib.sha256(dsdt_raw).hexdigest() != dsdt_hash:
+                return False
+            return self.get_summary(dsdt_hash, self.get_ssdt_key(dsdt_raw, tables[1])) != None
+        except:
+            return False
+
+    def get_response(self, dsdt_raw, ssdts = None, policy = "c", scope = None):
+        # Runs analyze() and returns a JSON-friendly dict with the generated
+        # files base64 encoded - errors are returned rather than raised
+        try:
+            result = self.analyze(dsdt_raw, ssdts, policy, scope)
+        except Exception as e:
+            return {"error":str(e)}
+        files = result["files"]
+        response = self.get_result_json(result)
+        response["files"] = dict([(x,base64.b64encode(files[x]).decode("utf-8")) for x in files])
+        return response
+
+    def serve(self, host = "127.0.0.1", port = 8080, processes = None, queue_size = None, timeout = 120):
+        # Serves POST /analyze over HTTP until interrupted - workers only
+        # download iasl should a request need it
+        self.iasl = self.iasl or self.check_iasl(download=False)
+        kwargs = {"host":host,"port":port,"processes":processes,"timeout":timeout}
+        if queue_size != None:
+            kwargs["queue_size"] = queue_size
+        s = service.Service(_get_response, _init_worker, (self.iasl,), validate=self.check_request, **kwargs)
+        host,port = s.start()
+        print("Serving on http://{}:{} with {:,} process{} ({:,} queued max) - Ctrl+C to stop".format(host,port,s.processes,"" if s.processes==1 else "es",s.queue_size))
+        try:
+            s.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    def handle_request(self, req):
+        # Runs a command line handed over by a --client in its working
+        # directory, returning what it printed and its exit code
+        out = StringIO()
+        cwd = os.getcwd()
+        stdout,stderr = sys.stdout,sys.stderr
+        try:
+            os.chdir(req["cwd"])
+            sys.stdout = sys.stderr = out
+            args = get_parser().parse_args(req["argv"])
+            if args.daemon or args.serve or args.watch:
+                raise Exception("--daemon, --serve and --watch can't be handed to a daemon")
+            if not args.dsdt and not args.stats:
+                raise Exception("A DSDT.aml or origin folder is required")
+            code = self.cli(args)
+        except SystemExit as e:
+            # argparse bailing on bad arguments or --help
+            code = e.code
+        except Exception as e:
+            print("An error occurred :(\n - {}".format(e))
+            code = 1
+        finally:
+            sys.stdout,sys.stderr = stdout,stderr
+            os.chdir(cwd)
+        return {"code":code,"output":out.getvalue()}
+
+    def run_daemon(self, path):
+        # Stays resident on a Unix socket with iasl resolved up front and the
+        # parsed tables and results kept in memory between jobs
+        try:
+            self.get_iasl()
+            self.get_iasl_version()
+        except Exception as e:
+            print("{} - continuing without it".format(e))
+        self.tables_size = 32
+        self.summary_cache.memory = 256
+        self.result_cache.memory = 256
+        d = daemon.Daemon(self.handle_request, path)
+        try:
+            d.start()
+        except Exception as e:
+            print("An error occurred :(\n - {}".format(e))
+            return 1
+        print("Listening on {} - Ctrl+C to stop".format(path))
+        # Treat a plain kill like Ctrl+C so the socket gets cleaned up
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        try:
+            d.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    def cli(self, args):
+        # Non-interactive entry point for the argparse options
+        self.quiet = args.quiet or args.json or bool(args.serve)
+        if args.stats:
+            print(json.dumps(self.get_cache_stats(),indent=2))
+            return 0
+        if args.serve:
+            host,_,port = args.serve.rpartition(":")
+            try:
+                return self.serve(host or "127.0.0.1", int(port), args.processes, args.queue, args.timeout)
+            except Exception as e:
+                print("An error occurred :(\n - {}".format(e))
+                return 1
+        policy = args.irqs if args.irqs else args.policy
+        if args.watch:
+            try:
+                self.run_watch(args.dsdt, policy, args.scope, args.output, args.interval)
+            except KeyboardInterrupt:
+                return 0
+            except Exception as e:
+                print("An error occurred :(\n - {}".format(e))
+                return 1
+        if args.batch:
+            try:
+                results,report = self.run_batch(args.dsdt, policy, args.scope, args.output, args.processes, args.fresh)
+            except Exception as e:
+                print("An error occurred :(\n - {}".format(e))
+                return 1
+            if args.json:
+                print(json.dumps(results,indent=2,sort_keys=True))
+            else:
+                for x in report:
+                    print(x)
+            return 0 if all(x["status"] == "ok" for x in results) else 1
+        try:
+            result = self.process(args.dsdt, policy, args.scope, args.output)
+        except Exception as e:
+            if args.json:
+                print(json.dumps({"error":str(e)},indent=2))
+            else:
+                print("An error occurred :(\n - {}".format(e))
+            return 1
+        if args.json:
+            summary = self.get_result_json(result)
+            summary["paths"] = result["paths"]
+            if "timings" in result:
+                summary["timings"] = result["timings"]
+            print(json.dumps(summary,indent=2))
+        elif self.quiet:
+            for x in result["paths"]:
+                print(x)
+        else:
+            if result.get("cached"):
+                for p in result["patches"]:
+                    self.print_patch(p)
+            else:
+                self.print_timings(result["timings"])
+            print("Saved to {}".format(os.path.dirname(result["paths"][0])))
+        return 0
+
+# Batch workers - these live at module level so the process pool can pickle them
+_worker = None
+
+def _init_worker(iasl = None):
+    # Each worker process gets its own FixHPET (and so its own iasl subprocesses)
+    global _worker
+    _worker = FixHPET()
+    _worker.quiet = True
+    _worker.iasl = iasl
+
+def _get_item(item):
+    try:
+        return _worker.get_item(*item)
+    finally:
+        _worker.flush_cache_stats()
+
+def _get_response(dsdt_raw, ssdts, policy, scope):
+    try:
+        return _worker.get_response(dsdt_raw, ssdts, policy, scope)
+    finally:
+        _worker.flush_cache_stats()
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog="FixHPET.py", description="Examines a DSDT and builds patches and an SSDT to null out legacy IRQ conflicts with HPET.  Runs interactively if no DSDT is passed.")
+    parser.add_argument("dsdt", nargs="?", help="path to a DSDT.aml or an origin folder containing one")
+    parser.add_argument("-p", "--policy", default="c", type=str.lower, choices=["c","o","l"], help="C: conflicting IRQs from legacy devices (default), O: conflicting IRQs from all devices, L: all legacy IRQs")
+    parser.add_argument("-i", "--irqs", help="custom list of devices and IRQs to remove - overrides --policy (eg. \"RTC:0 IPIC: TMR:8,11\")")
+    parser.add_argument("-s", "--scope", help="the device HPET lives under (eg. LPCB or LPC) - detected if omitted")
+    parser.add_argument("-o", "--output", help="folder to save the results to (default is Results next to this script)")
+    parser.add_argument("-j", "--json", action="store_true", help="print a JSON summary of the results")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print the paths of the saved files")
+    parser.add_argument("-b", "--batch", action="store_true", help="treat the path as a tree of origin folders and process every DSDT found in parallel")
+    parser.add_argument("-n", "--processes", type=int, help="number of worker processes for --batch (default is the number of CPUs)")
+    parser.add_argument("--fresh", action="store_true", help="ignore the --batch journal and reprocess every folder")
+    parser.add_argument("-w", "--watch", action="store_true", help="keep polling the origin folder and rerun whenever DSDT.aml changes")
+    parser.add_argument("--interval", type=float, default=1, help="seconds between --watch polls (default is 1)")
+    parser.add_argument("--serve", metavar="[HOST:]PORT", help="serve POST /analyze over HTTP on the passed port (localhost unless a host is given)")
+    parser.add_argument("--queue", type=int, help="max requests waiting for a worker in --serve mode before answering 429 (default is 4 per process)")
+    parser.add_argument("--timeout", type=int, default=120, help="seconds a --serve request may run before its worker is killed and it answers 504 (default is 120)")
+    parser.add_argument("--daemon", action="store_true", help="stay resident and run --client jobs handed over the Unix socket")
+    parser.add_argument("--client", action="store_true", help="hand this job to a running --daemon (runs locally if there isn't one)")
+    parser.add_argument("--socket", default=get_socket(), help="the Unix socket for --daemon and --client (default is {})".format(get_socket()))
+    parser.add_argument("--stats", action="store_true", help="print the cache hit/miss statistics as JSON and exit")
+    return parser
+
 if __name__ == '__main__':
+    args = get_parser().parse_args()
     f = FixHPET()
-    f.main()
+    if args.daemon:
+        sys.exit(f.run_daemon(args.socket))
+    if not args.dsdt and not args.stats and not args.serve:
+        f.main()
+    else:
+        sys.exit(f.cli(args))
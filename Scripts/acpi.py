@@ -0,0 +1,75 @@
+import os, struct
+
+class Table:
+
+    def __init__(self, path):
+        # Header fields are filled in by load() - the rest of the file is only
+        # read if the checksum is verified
+        self.path = path
+        self.size = 0
+        self.signature = None
+        self.length = 0
+        self.revision = 0
+        self.checksum = 0
+        self.oem_id = None
+        self.table_id = None
+        self.oem_revision = 0
+        self.creator_id = None
+        self.creator_revision = 0
+        self.valid = None # Checksum result once verified
+        # What dumpers name tables - anything else (.bak, .orig, ~) is a copy
+        self.dump_extensions = ("",".aml",".dat",".bin")
+
+    def __repr__(self):
+        return "Table({},{},{:,},{})".format(os.path.basename(self.path),self.signature,self.length,self.table_id)
+
+    def is_dump(self):
+        # True if the file is named like a table dump rather than a backup
+        return os.path.splitext(self.path)[1].lower() in self.dump_extensions
+
+    def _read(self, fd, size, offset):
+        # Positioned read where we have it, seek + read where we don't
+        if hasattr(os,"pread"):
+            return os.pread(fd, size, offset)
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, size)
+
+    def load(self):
+        # Reads only the 36 byte header - raises if it isn't an ACPI table
+        fd = os.open(self.path, os.O_RDONLY | getattr(os,"O_BINARY",0))
+        try:
+            header = self._read(fd, 36, 0)
+            self.size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if len(header) < 36:
+            raise Exception("Too short to be an ACPI table")
+        sig,self.length,self.revision,self.checksum,oem_id,table_id,self.oem_revision,creator_id,self.creator_revision = struct.unpack("<4sIBB6s8sI4sI",header)
+        if not all([chr(x).isupper() or chr(x).isdigit() for x in bytearray(sig)]):
+            raise Exception("Invalid table signature")
+        if not 36 <= self.length <= self.size:
+            raise Exception("Table length is out of bounds")
+        self.signature = sig.decode("ascii")
+        # Ids are space or null padded - keep the raw OEM Table ID as well,
+        # it's what OpenCore matches patches against
+        self.oem_id = oem_id.decode("latin-1").rstrip("\x00 ")
+        self.table_id = table_id.decode("latin-1").rstrip("\x00 ")
+        self.table_id_raw = table_id
+        self.creator_id = creator_id.decode("latin-1").rstrip("\x00 ")
+        return self
+
+    def verify(self):
+        # Sums the table a chunk at a time - every byte (checksum included)
+        # must add up to 0.  Only done when asked for, and remembered.
+        if self.valid == None:
+            total = 0
+            remaining = self.length
+            with open(self.path,"rb") as f:
+                while remaining:
+                    chunk = f.read(min(remaining,1048576))
+                    if not chunk:
+                        break
+                    total += sum(bytearray(chunk))
+                    remaining -= len(chunk)
+            self.valid = not remaining and total % 256 == 0
+        return self.valid
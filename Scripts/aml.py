@@ -0,0 +1,397 @@
+import sys, os, struct
+sys.path.append(os.path.abspath(os.path.dirname(os.path.realpath(__file__))))
+import listing, irq
+
+class AML:
+
+    def __init__(self):
+        # Opcodes that hold a TermList of named objects we walk into
+        self.scope_ops = {
+            0x10:      "Scope",
+            0x5B82:    "Device",
+            0x5B83:    "Processor",
+            0x5B84:    "PowerResource",
+            0x5B85:    "ThermalZone"
+        }
+        # Fixed size args following the NameString of the above
+        self.scope_args = {0x5B83:6, 0x5B84:3}
+        # Simple integer data objects and their total sizes
+        self.const_ops = {0x00:1, 0x01:1, 0xFF:1, 0x0A:2, 0x0B:3, 0x0C:5, 0x0E:9}
+        # Binary math ops (Operand Operand Target) allowed in OperationRegion args
+        self.math_ops = (0x72, 0x74, 0x77, 0x79, 0x7A, 0x7B, 0x7D, 0x7F)
+        # Valid small and large resource descriptor types
+        self.small_types = (0x04, 0x05, 0x06, 0x07, 0x08, 0x09, 0x0A, 0x0E, 0x0F)
+        self.large_types = range(0x81, 0x8F)
+
+    def get_pkg_length(self, data, i):
+        # Returns the package length and the number of bytes used to encode it
+        lead = data[i]
+        count = lead >> 6
+        if not count:
+            return (lead & 0x3F, 1)
+        length = lead & 0x0F
+        for x in range(count):
+            length |= data[i+1+x] << (4+8*x)
+        return (length, count+1)
+
+    def get_name_seg(self, data, i):
+        seg = data[i:i+4]
+        if len(seg) != 4 or not all([chr(x).isupper() or chr(x).isdigit() or chr(x) == "_" for x in seg]) or chr(seg[0]).isdigit():
+            raise Exception("Invalid NameSeg at 0x{:X}".format(i))
+        # iasl trims trailing underscores when printing
+        return seg.decode("ascii").rstrip("_") or "_"
+
+    def get_name_string(self, data, i):
+        # Returns the name as iasl would print it, and the offset past it
+        prefix = ""
+        while i < len(data) and chr(data[i]) in "\\^":
+            prefix += chr(data[i])
+            i += 1
+        if i >= len(data):
+            raise Exception("Truncated NameString")
+        if data[i] == 0x00: # NullName
+            return (prefix, i+1)
+        if data[i] == 0x2E: # DualNamePrefix
+            count,i = 2,i+1
+        elif data[i] == 0x2F: # MultiNamePrefix
+            count,i = data[i+1],i+2
+        else:
+            count = 1
+        segs = [self.get_name_seg(data, i+4*x) for x in range(count)]
+        return (prefix+".".join(segs), i+4*count)
+
+    def is_name_lead(self, c):
+        return chr(c) in "\\^_" or chr(c).isupper() or c in (0x2E, 0x2F)
+
+    def get_defined_names(self, raw):
+        # Returns the set of NameSegs (as raw bytes) a table may define - found
+        # with a loose byte scan rather than a walk, so it never fails and
+        # errs on the side of too many.  Reserved _XXX names are left out as
+        # every table has those.
+        data = bytearray(raw)
+        length = len(data)
+        if length >= 36:
+            length = min(length, data[4] | data[5] << 8 | data[6] << 16 | data[7] << 24)
+        names = set()
+        # Opcode, and whether a PkgLength comes before the NameString
+        for op,pkg in ((b"\x14",True),(b"\x5B\x82",True),(b"\x5B\x83",True),(b"\x5B\x84",True),(b"\x5B\x85",True),
+                       (b"\x08",False),(b"\x5B\x80",False),(b"\x5B\x01",False),(b"\x5B\x02",False)):
+            i = data.find(op, 36, length)
+            while i != -1:
+                j = i+len(op)
+                try:
+                    if pkg:
+                        size,used = self.get_pkg_length(data, j)
+                        if j+size > length:
+                            raise Exception("Overruns the table")
+                        j += used
+                    name,j = self.get_name_string(data, j)
+                    seg = bytes(data[j-4:j])
+                    if name and not name[-1] in "\\^" and not seg.startswith(b"_"):
+                        names.add(seg)
+                except Exception:
+                    pass
+                i = data.find(op, i+1, length)
+        return names
+
+    def get_buffer(self, data, i, end):
+        # Returns (start, end) of a BufferOp's initializer at i, or None
+        try:
+            if data[i] != 0x11:
+                return None
+            length,used = self.get_pkg_length(data, i+1)
+            buf_end = i+1+length
+            j = i+1+used
+            if buf_end > end or j >= buf_end:
+                return None
+            if data[j] == 0x0A:
+                size,j = data[j+1],j+2
+            elif data[j] == 0x0B:
+                size,j = data[j+1] | data[j+2] << 8,j+3
+            else:
+                return None
+            if size != buf_end-j:
+                return None
+            return (j, buf_end)
+        except IndexError:
+            return None
+
+    def get_descriptors(self, data, start, end):
+        # Returns a list of (offset, tag) for a valid ResourceTemplate, or None
+        descs = []
+        i = start
+        while i < end:
+            tag = data[i]
+            if tag & 0x80:
+                if not tag in self.large_types or i+3 > end:
+                    return None
+                length = 3+(data[i+1] | data[i+2] << 8)
+            else:
+                if not (tag >> 3) in self.small_types:
+                    return None
+                length = 1+(tag & 0x07)
+            descs.append((i, tag))
+            i += length
+            if tag == 0x79:
+                # End tag must close out the buffer
+                return descs if i == end else None
+        return None
+
+    def walk(self, raw):
+        # Walks the AML of a DSDT/SSDT and returns a listing.Listing keyed on
+        # raw offsets instead of listing lines.  Raises on anything we can't
+        # confidently decode so the caller can fall back on iasl.
+        data = bytearray(raw)
+        if len(data) < 36 or not data[0:4] in (b"DSDT", b"SSDT"):
+            raise Exception("Not a DSDT or SSDT")
+        length = data[4] | data[5] << 8 | data[6] << 16 | data[7] << 24
+        if length > len(data) or length < 36:
+            raise Exception("Table length is out of bounds")
+        self.data = data
+        self.groups = {}
+        self.spans = {}
+        self.current_device = None
+        self.found_hpet = False
+        self.hpet_crs = -1
+        try:
+            self._walk_terms(36, length)
+        except IndexError:
+            raise Exception("AML is truncated")
+        if self.hpet_crs == -1:
+            raise Exception("Could not locate HPET _CRS")
+        l = listing.Listing()
+        l.hpet_crs = self.hpet_crs
+        l.raw_spans = self.spans
+        l.has_lpcb = b"PCI0LPCB" in raw
+        l.has_lpc = b"PCI0LPC" in raw
+        l.devices = self.groups
+        return l
+
+    def _walk_terms(self, i, end):
+        data = self.data
+        while i < end:
+            op = data[i]
+            if op == 0x5B:
+                op = 0x5B00 | data[i+1]
+                i += 2
+            else:
+                i += 1
+            if op in self.scope_ops:
+                length,used = self.get_pkg_length(data, i)
+                obj_end = i+length
+                if obj_end > end:
+                    raise Exception("{} at 0x{:X} overruns its parent".format(self.scope_ops[op], i))
+                name,j = self.get_name_string(data, i+used)
+                if op == 0x5B82:
+                    self.current_device = name
+                    if name == "HPET":
+                        self.found_hpet = True
+                self._walk_terms(j+self.scope_args.get(op,0), obj_end)
+                i = obj_end
+            elif op == 0x14: # Method
+                start = i-1
+                length,used = self.get_pkg_length(data, i)
+                obj_end = i+length
+                if obj_end > end:
+                    raise Exception("Method at 0x{:X} overruns its parent".format(start))
+                name,j = self.get_name_string(data, i+used)
+                if self.found_hpet and self.hpet_crs == -1 and name == "_CRS":
+                    self.hpet_crs = start
+                    self.spans[start] = obj_end
+                self._scan(j+1, obj_end)
+                i = obj_end
+            elif op == 0x08: # Name
+                name,i = self.get_name_string(data, i)
+                i = self._skip_data(i, end)
+            elif op == 0x15: # External
+                name,i = self.get_name_string(data, i)
+                i += 2
+            elif op == 0x06: # Alias
+                name,i = self.get_name_string(data, i)
+                name,i = self.get_name_string(data, i)
+            elif op == 0x5B80: # OperationRegion
+                name,i = self.get_name_string(data, i)
+                i = self._skip_term_arg(i+1, end)
+                i = self._skip_term_arg(i, end)
+            elif op in (0x5B81, 0x5B86, 0x5B87, 0xA0, 0xA1, 0xA2):
+                # Field, IndexField, BankField, If, Else, While - scan the body
+                length,used = self.get_pkg_length(data, i)
+                obj_end = i+length
+                if obj_end > end:
+                    raise Exception("Opcode 0x{:X} at 0x{:X} overruns its parent".format(op, i))
+                if op in (0xA0, 0xA1, 0xA2):
+                    self._scan(i+used, obj_end)
+                i = obj_end
+            elif op == 0x5B01: # Mutex
+                name,i = self.get_name_string(data, i)
+                i += 1
+            elif op == 0x5B02: # Event
+                name,i = self.get_name_string(data, i)
+            else:
+                raise Exception("Unhandled opcode 0x{:X} at 0x{:X}".format(op, i-1))
+        if i != end:
+            raise Exception("Term list overran its parent at 0x{:X}".format(end))
+
+    def _skip_data(self, i, end):
+        # Skips a DataRefObject, scanning any buffers/packages it holds
+        data = self.data
+        op = data[i]
+        if op in self.const_ops:
+            return i+self.const_ops[op]
+        if op == 0x0D: # String
+            j = data.find(b"\x00", i+1, end)
+            if j == -1:
+                raise Exception("Unterminated string at 0x{:X}".format(i))
+            return j+1
+        if op in (0x11, 0x12, 0x13): # Buffer, Package, VarPackage
+            length,used = self.get_pkg_length(data, i+1)
+            obj_end = i+1+length
+            if obj_end > end:
+                raise Exception("Data object at 0x{:X} overruns its parent".format(i))
+            self._scan(i, obj_end)
+            return obj_end
+        raise Exception("Unhandled data object 0x{:X} at 0x{:X}".format(op, i))
+
+    def _skip_term_arg(self, i, end):
+        data = self.data
+        op = data[i]
+        if op in self.const_ops or op in (0x0D, 0x11, 0x12, 0x13):
+            return self._skip_data(i, end)
+        if 0x60 <= op <= 0x6E: # LocalX, ArgX
+            return i+1
+        if op in self.math_ops:
+            i = self._skip_term_arg(i+1, end)
+            i = self._skip_term_arg(i, end)
+            return self._skip_target(i)
+        if self.is_name_lead(op):
+            return self.get_name_string(data, i)[1]
+        raise Exception("Unhandled TermArg 0x{:X} at 0x{:X}".format(op, i))
+
+    def _skip_target(self, i):
+        if self.data[i] == 0x00:
+            return i+1
+        if 0x60 <= self.data[i] <= 0x6E:
+            return i+1
+        return self.get_name_string(self.data, i)[1]
+
+    def _scan(self, i, end):
+        # Scans an opaque region (method body, package, etc) for buffers
+        # holding resource templates.  Bail if it looks like a Device is
+        # hiding in here as we'd lose track of the current device.
+        data = self.data
+        d = data.find(b"\x5B\x82", i, end)
+        while d != -1:
+            if self._is_device(d, end):
+                raise Exception("Possible Device declared at 0x{:X}".format(d))
+            d = data.find(b"\x5B\x82", d+2, end)
+        while True:
+            i = data.find(b"\x11", i, end)
+            if i == -1:
+                break
+            buf = self.get_buffer(data, i, end)
+            descs = self.get_descriptors(data, buf[0], buf[1]) if buf else None
+            if descs == None:
+                i += 1
+                continue
+            self._add_irqs(descs)
+            i = buf[1]
+
+    def _is_device(self, i, end):
+        # Checks if the DeviceOp at i has a sane PkgLength and NameString
+        try:
+            length,used = self.get_pkg_length(self.data, i+2)
+            if i+2+length > end:
+                return False
+            self.get_name_string(self.data, i+2+used)
+        except:
+            return False
+        return True
+
+    def _add_irqs(self, descs):
+        # Records IRQNoFlags descriptors - consecutive ones are grouped as
+        # a single patch as they share the same bytes
+        data = self.data
+        last_irq = None
+        for offset,tag in descs:
+            if tag != 0x22 or not self.current_device:
+                last_irq = None
+                continue
+            mask = data[offset+1] | data[offset+2] << 8
+            if last_irq:
+                # Searched for from the start of the run it continues
+                last_irq = irq.IRQ(last_irq.index, offset, mask, True)
+            else:
+                last_irq = irq.IRQ(offset, offset, mask)
+                self.spans[offset] = descs[-1][0]+2
+            self.groups.setdefault(self.current_device,[]).append(last_irq)
+
+    def encode_pkg_length(self, length):
+        # Encodes a PkgLength for a body of the passed length - the encoded
+        # value includes the PkgLength bytes themselves
+        if length+1 <= 0x3F:
+            return bytearray([length+1])
+        for count in (1,2,3):
+            total = length+count+1
+            if total < 1 << (4+8*count):
+                out = bytearray([(count << 6) | (total & 0x0F)])
+                for x in range(count):
+                    out.append((total >> (4+8*x)) & 0xFF)
+                return out
+        raise Exception("PkgLength too large")
+
+    def encode_name_string(self, path):
+        # Encodes an ASL path like \_SB.PCI0.LPCB into a NameString
+        out = bytearray()
+        while path[:1] in ("\\","^"):
+            out.append(ord(path[0]))
+            path = path[1:]
+        segs = []
+        for seg in path.split("."):
+            seg = seg.upper()
+            if not 0 < len(seg) <= 4 or seg[0].isdigit() or not all([x.isupper() or x.isdigit() or x == "_" for x in seg]):
+                raise Exception("Invalid NameSeg \"{}\"".format(seg))
+            segs.append(seg.ljust(4,"_").encode("ascii"))
+        if len(segs) == 2:
+            out.append(0x2E)
+        elif len(segs) > 2:
+            out.extend([0x2F,len(segs)])
+        for seg in segs:
+            out.extend(seg)
+        return out
+
+    def build_table(self, signature, body, oem_id, table_id, revision = 2, oem_revision = 0, creator_id = "INTL", creator_revision = 0x20180427):
+        # Wraps the AML body in a table header and sets the checksum
+        header = struct.pack("<4sIBB6s8sI4sI",
+            signature.encode("ascii"),
+            36+len(body),
+            revision,
+            0,
+            oem_id.encode("ascii"),
+            table_id.encode("ascii"),
+            oem_revision,
+            creator_id.encode("ascii"),
+            creator_revision
+        )
+        table = bytearray(header)+body
+        table[9] = (0x100-sum(table) % 0x100) % 0x100
+        return bytes(table)
+
+    def build_ssdt_hpet(self, scope, irqs, base = 0xFED00000, length = 0x400):
+        # Builds the same SSDT-HPET.aml iasl would compile from our template:
+        #
+        # External (_SB_.PCI0.[[scope]], DeviceObj)
+        # Name (\_SB.PCI0.[[scope]].HPET._CRS, ResourceTemplate () {
+        #     IRQNoFlags () {irqs}
+        #     Memory32Fixed (ReadWrite, base, length)
+        # })
+        mask = 0
+        for x in irqs:
+            mask |= 1 << x
+        body = bytearray([0x15])+self.encode_name_string("_SB_.PCI0."+scope)+bytearray([0x06,0x00])
+        rt = bytearray(struct.pack("<BH",0x22,mask))
+        rt += struct.pack("<BHBII",0x86,0x09,0x01,base,length)
+        rt += bytearray([0x79,0x00])
+        buf = bytearray([0x0A,len(rt)])+rt
+        body += bytearray([0x08])+self.encode_name_string("\\_SB.PCI0."+scope+".HPET._CRS")
+        body += bytearray([0x11])+self.encode_pkg_length(len(buf))+buf
+        return self.build_table("SSDT", body, "hack", "HPET")
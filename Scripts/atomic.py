@@ -0,0 +1,46 @@
+import os, tempfile
+
+# Read once at import - the umask can only be read by setting it, and doing
+# that later on could race other threads creating files
+_umask = os.umask(0)
+os.umask(_umask)
+
+class Atomic:
+
+    def get_mode(self, path):
+        # The mode a plain open() would have left us with - the existing
+        # file's, or 0666 less the umask for a new one
+        try:
+            return os.stat(path).st_mode & 0o777
+        except OSError:
+            return 0o666 & ~_umask
+
+    def replace(self, source, target):
+        # os.replace where we have it, remove + rename on older Pythons
+        if hasattr(os,"replace"):
+            return os.replace(source, target)
+        if os.path.exists(target):
+            os.remove(target)
+        os.rename(source, target)
+
+    def write(self, path, data, max_size = None, mode = None):
+        # Writes data (bytes, or an iterable of byte chunks) to a temp file
+        # next to path and renames it into place, so nothing ever sees a half
+        # written file.  Raises if it comes to more than max_size bytes.  The
+        # mode defaults to what a plain open() would give, less the umask.
+        fd,temp = tempfile.mkstemp(dir=os.path.dirname(path) or ".",prefix=".")
+        try:
+            with os.fdopen(fd,"wb") as f:
+                for chunk in [data] if isinstance(data,(bytes,bytearray)) else data:
+                    f.write(chunk)
+                size = f.tell()
+            if max_size != None and size > max_size:
+                raise Exception("{} would be over {:,} bytes".format(os.path.basename(path),max_size))
+            # mkstemp makes owner-only files
+            os.chmod(temp, self.get_mode(path) if mode == None else mode & ~_umask)
+            self.replace(temp, path)
+        except:
+            try: os.remove(temp)
+            except: pass
+            raise
+        return path
@@ -0,0 +1,73 @@
+import sys, os, json, csv, multiprocessing
+sys.path.append(os.path.abspath(os.path.dirname(os.path.realpath(__file__))))
+import acpi
+
+class Batch:
+
+    def __init__(self, processes = None):
+        # Size the pool to the host unless told otherwise
+        self.processes = processes or multiprocessing.cpu_count() or 1
+        self.table = "DSDT.aml"
+        self.fields = ["path","status","error","hpet_crs","scope","devices","irqs","missing","patches","output","cached"]
+
+    def is_dsdt(self, path):
+        # Only reads the table header - backup copies don't count
+        try:
+            t = acpi.Table(path)
+            return t.is_dump() and t.load().signature == "DSDT"
+        except Exception:
+            return False
+
+    def find(self, root):
+        # Returns a sorted list of every folder under root holding a DSDT -
+        # told apart by its header like get_tables() does, so misnamed dumps
+        # are found too.  A DSDT.aml is checked first as it's the usual case.
+        found = []
+        for path,dirs,files in os.walk(root):
+            # Skip hidden folders and walk in a stable order
+            dirs[:] = sorted(x for x in dirs if not x.startswith("."))
+            files = sorted([x for x in files if not x.startswith(".")], key=lambda x: x != self.table)
+            if any(self.is_dsdt(os.path.join(path,x)) for x in files):
+                found.append(path)
+        return found
+
+    def run(self, items, worker, initializer = None, initargs = ()):
+        # Yields worker(item) for each item as they finish - fanned out over a
+        # process pool when we have more than one item and process to work with
+        if self.processes == 1 or len(items) < 2:
+            if initializer:
+                initializer(*initargs)
+            for item in items:
+                yield worker(item)
+            return
+        pool = multiprocessing.Pool(min(self.processes,len(items)), initializer, initargs)
+        try:
+            for result in pool.imap_unordered(worker, items):
+                yield result
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _get_cell(self, value):
+        # Flattens the report values into something a spreadsheet can show
+        if isinstance(value, dict):
+            return " ".join("{}:{}".format(x,",".join(str(y) for y in value[x])) for x in sorted(value))
+        if isinstance(value, list):
+            return " ".join("{}>{}".format(x["Find"],x["Replace"]) if isinstance(x, dict) else str(x) for x in value)
+        if value == None:
+            return ""
+        return str(value)
+
+    def write_json(self, results, path):
+        with open(path,"w") as f:
+            json.dump(results,f,indent=2,sort_keys=True)
+        return path
+
+    def write_csv(self, results, path):
+        with open(path,"w") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.fields)
+            for r in results:
+                writer.writerow([self._get_cell(r.get(x)) for x in self.fields])
+        return path
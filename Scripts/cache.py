@@ -0,0 +1,217 @@
+import sys, os, zlib, hashlib, json, collections, threading, time, atexit
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+sys.path.append(os.path.abspath(os.path.dirname(os.path.realpath(__file__))))
+import atomic
+
+class Cache:
+
+    def __init__(self, path, max_size = 268435456, memory = 0, flush_size = 64, flush_interval = 5):
+        # max_size is the total bytes the cache may hold on disk (256MiB default),
+        # memory is how many decompressed entries to also keep in RAM (0 = none).
+        # Hits and misses are counted in RAM and merged into stats.json every
+        # flush_size lookups or flush_interval seconds, and again at exit.
+        self.path = path
+        self.max_size = max_size
+        self.memory = memory
+        self.entries = collections.OrderedDict()
+        self.ext = ".z"
+        self.stats_file = "stats.json"
+        self.stats_lock = threading.Lock()
+        self.counts = {"hits":0,"misses":0}
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.flushed = time.time()
+        atexit.register(self.flush_stats)
+        self.atomic = atomic.Atomic()
+
+    def get_key(self, *parts):
+        # Hashes the passed parts (bytes or str) into a single hex key
+        h = hashlib.sha256()
+        for p in parts:
+            if not isinstance(p, bytes):
+                p = str(p).encode("utf-8")
+            # Prefix each part with its length so the boundaries are unambiguous
+            h.update(str(len(p)).encode("utf-8")+b":"+p)
+        return h.hexdigest()
+
+    def _get_path(self, key):
+        return os.path.join(self.path, key+self.ext)
+
+    def _remember(self, key, data):
+        # Keeps the most recently used entries in RAM, dropping the oldest
+        if not self.memory:
+            return
+        self.entries.pop(key,None)
+        self.entries[key] = data
+        while len(self.entries) > self.memory:
+            self.entries.popitem(last=False)
+
+    def get(self, key):
+        # Returns the decompressed data for key, or None on a miss
+        if key in self.entries:
+            self._remember(key, self.entries[key])
+            self._count("hits")
+            return self.entries[key]
+        path = self._get_path(key)
+        try:
+            with open(path,"rb") as f:
+                data = zlib.decompress(f.read())
+        except:
+            self._count("misses")
+            return None
+        # Bump the mtime so eviction treats this as recently used
+        try: os.utime(path, None)
+        except: pass
+        self._count("hits")
+        self._remember(key, data)
+        return data
+
+    def _load_stats(self):
+        stats = {"hits":0,"misses":0}
+        try:
+            with open(os.path.join(self.path,self.stats_file),"r") as f:
+                counts = json.load(f)
+        except:
+            return stats
+        for k in stats:
+            stats[k] += counts.get(k,0)
+        return stats
+
+    def _count(self, name):
+        # Bumps the in-memory hit/miss counter, merging them to disk now and then
+        with self.stats_lock:
+            self.counts[name] += 1
+            flush = sum(self.counts.values()) >= self.flush_size or time.time()-self.flushed >= self.flush_interval
+        if flush:
+            self.flush_stats()
+
+    def flush_stats(self):
+        # Adds the counts so far to stats.json - read, added to and rewritten
+        # under a file lock so other processes flushing can't drop any
+        with self.stats_lock:
+            counts = self.counts
+            self.counts = {"hits":0,"misses":0}
+            self.flushed = time.time()
+            if not any(counts.values()):
+                return
+            try:
+                if not os.path.isdir(self.path):
+                    os.makedirs(self.path)
+                with open(os.path.join(self.path,self.stats_file+".lock"),"a") as lock:
+                    if fcntl:
+                        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+                    stats = self._load_stats()
+                    for k in counts:
+                        stats[k] += counts[k]
+                    self.atomic.write(os.path.join(self.path,self.stats_file), json.dumps(stats).encode("utf-8"))
+            except:
+                pass
+
+    def stats(self):
+        # Returns the hit/miss counters along with the current entry count and size
+        stats = self._load_stats()
+        with self.stats_lock:
+            for k in self.counts:
+                stats[k] += self.counts[k]
+        stats["entries"] = stats["size"] = 0
+        if os.path.isdir(self.path):
+            for x in os.listdir(self.path):
+                if x.endswith(self.ext):
+                    stats["entries"] += 1
+                    stats["size"] += os.path.getsize(os.path.join(self.path,x))
+        total = stats.get("hits",0)+stats.get("misses",0)
+        stats["hit_rate"] = float(stats.get("hits",0))/total if total else 0.0
+        return stats
+
+    def put(self, key, data):
+        # Compresses and stores data under key, then evicts if needed
+        self._remember(key, data)
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        data = zlib.compress(data)
+        if len(data) > self.max_size:
+            return False
+        # Written atomically so readers never see a partial entry
+        try:
+            self.atomic.write(self._get_path(key), data)
+        except:
+            return False
+        self.evict(keep=key)
+        return True
+
+    def put_file(self, key, path):
+        # Like put, but compresses the file at path a chunk at a time so it
+        # never has to be read in whole - not kept in the RAM layer either
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        try:
+            with open(path,"rb") as f:
+                self.atomic.write(self._get_path(key), self._compress(f), self.max_size)
+        except:
+            return False
+        self.evict(keep=key)
+        return True
+
+    def get_file(self, key, path):
+        # Like get, but decompresses the entry into the file at path a chunk
+        # at a time so it never has to be held in whole - returns path, or
+        # None on a miss
+        try:
+            f = open(self._get_path(key),"rb")
+        except:
+            self._count("misses")
+            return None
+        try:
+            with f:
+                self.atomic.write(path, self._decompress(f))
+        except:
+            self._count("misses")
+            return None
+        try: os.utime(self._get_path(key), None)
+        except: pass
+        self._count("hits")
+        return path
+
+    def _decompress(self, f):
+        # Yields the decompressed contents of f a chunk at a time
+        z = zlib.decompressobj()
+        for chunk in iter(lambda: f.read(1048576), b""):
+            yield z.decompress(chunk)
+        yield z.flush()
+
+    def _compress(self, f):
+        # Yields the compressed contents of f a chunk at a time
+        z = zlib.compressobj()
+        for chunk in iter(lambda: f.read(1048576), b""):
+            yield z.compress(chunk)
+        yield z.flush()
+
+    def evict(self, keep = None):
+        # Removes the least recently used entries until we're under max_size
+        if not os.path.isdir(self.path):
+            return
+        entries = []
+        total = 0
+        for x in os.listdir(self.path):
+            if not x.endswith(self.ext):
+                continue
+            try:
+                st = os.stat(os.path.join(self.path,x))
+            except:
+                continue
+            entries.append((st.st_mtime, st.st_size, x))
+            total += st.st_size
+        entries.sort()
+        for mtime,size,x in entries:
+            if total <= self.max_size:
+                break
+            if keep and x == keep+self.ext:
+                continue
+            try:
+                os.remove(os.path.join(self.path,x))
+                total -= size
+            except:
+                pass
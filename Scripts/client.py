@@ -0,0 +1,36 @@
+import os, socket, json
+
+class Client:
+
+    def __init__(self, path, timeout = 600):
+        self.path = path
+        self.timeout = timeout
+
+    def request(self, req):
+        # Sends one JSON request to the daemon and returns its JSON response -
+        # raises socket.error if there's no daemon listening
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.settimeout(self.timeout)
+        try:
+            s.connect(self.path)
+            s.sendall((json.dumps(req)+"\n").encode("utf-8"))
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = s.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+        finally:
+            s.close()
+        return json.loads(data.decode("utf-8"))
+
+    def run(self, argv):
+        # Hands the command line to the daemon to run in our working directory,
+        # prints what it printed and returns its exit code
+        resp = self.request({"argv":argv,"cwd":os.getcwd()})
+        if "error" in resp:
+            print("An error occurred :(\n - {}".format(resp["error"]))
+            return 1
+        if resp.get("output"):
+            print(resp["output"].rstrip("\n"))
+        return resp.get("code",0)
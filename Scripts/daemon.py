@@ -0,0 +1,77 @@
+import os, socket, json, threading
+try:
+    from SocketServer import ThreadingMixIn, UnixStreamServer, StreamRequestHandler
+except:
+    from socketserver import ThreadingMixIn, UnixStreamServer, StreamRequestHandler
+
+class _Server(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+class _Handler(StreamRequestHandler):
+    daemon = None
+
+    def handle(self):
+        # One JSON request line in, one JSON response line out
+        try:
+            req = json.loads(self.rfile.readline().decode("utf-8"))
+            resp = self.daemon.handle(req)
+        except Exception as e:
+            resp = {"error":str(e)}
+        self.wfile.write((json.dumps(resp)+"\n").encode("utf-8"))
+
+class Daemon:
+
+    def __init__(self, handler, path):
+        # handler(request dict) -> response dict, called one job at a time
+        self.handler = handler
+        self.path = path
+        self.lock = threading.Lock()
+        self.server = None
+
+    def handle(self, req):
+        with self.lock:
+            return self.handler(req)
+
+    def is_running(self):
+        # True if something is already answering on our socket
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            s.connect(self.path)
+            return True
+        except:
+            return False
+        finally:
+            s.close()
+
+    def start(self):
+        if os.path.exists(self.path):
+            if self.is_running():
+                raise Exception("A daemon is already listening on {}".format(self.path))
+            # Left behind by a daemon that didn't shut down cleanly
+            os.remove(self.path)
+        d = os.path.dirname(self.path)
+        if d and not os.path.isdir(d):
+            os.makedirs(d)
+        handler = type("Handler",(_Handler,),{"daemon":self})
+        self.server = _Server(self.path, handler)
+        # Only our user gets to hand us jobs
+        os.chmod(self.path, 0o600)
+        return self.path
+
+    def serve_forever(self):
+        try:
+            self.server.serve_forever()
+        finally:
+            self.close()
+
+    def stop(self):
+        # Stops serve_forever() - must be called from another thread
+        if self.server:
+            self.server.shutdown()
+
+    def close(self):
+        if self.server:
+            self.server.server_close()
+            self.server = None
+        try: os.remove(self.path)
+        except: pass
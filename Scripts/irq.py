@@ -0,0 +1,32 @@
+class IRQ:
+    # One IRQNoFlags descriptor.  index is where its patch is searched from
+    # (the hex run in a listing, or the raw offset when walking AML), offset
+    # is the descriptor's own raw offset if known, and mask holds one bit per
+    # IRQ.  chained is set when it directly follows another descriptor of the
+    # same device - those are patched together as one Find.
+    __slots__ = ("index","offset","mask","chained")
+
+    def __init__(self, index = -1, offset = -1, mask = 0, chained = False):
+        self.index = index
+        self.offset = offset
+        self.mask = mask
+        self.chained = chained
+
+    def __repr__(self):
+        return "IRQ({},{},0x{:04X},{})".format(self.index,self.offset,self.mask,self.chained)
+
+    def get_irqs(self):
+        return [x for x in range(16) if self.mask >> x & 1]
+
+    def get_text(self):
+        # The {0,8,11} list as iasl shows it - "#" for an empty one
+        return ",".join([str(x) for x in self.get_irqs()]) or "#"
+
+    def to_list(self):
+        # Compact JSON-friendly form for the caches
+        return [self.index,self.offset,self.mask,self.chained]
+
+    def from_list(self, values):
+        self.index,self.offset,self.mask,self.chained = values
+        self.chained = bool(self.chained)
+        return self
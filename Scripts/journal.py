@@ -0,0 +1,73 @@
+import os, json, time
+
+class Journal:
+
+    def __init__(self, path, batch_size = 32, interval = 5):
+        # Entries are fsynced every batch_size appends or interval seconds,
+        # whichever comes first - anything unsynced is simply redone on resume
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.entries = {}
+        self.pending = 0
+        self.synced = time.time()
+        self.f = None
+
+    def load(self):
+        # Reads every entry into a dict keyed on the entry's "key" - later
+        # entries win, and a torn last line from a crash is just skipped
+        self.entries = {}
+        if not os.path.exists(self.path):
+            return self.entries
+        with open(self.path,"r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self.entries[entry["key"]] = entry
+                except:
+                    continue
+        return self.entries
+
+    def is_done(self, key, input_hash):
+        # True if key finished successfully with the same input hash
+        entry = self.entries.get(key)
+        return entry != None and entry.get("status") == "ok" and entry.get("hash") == input_hash
+
+    def open(self, fresh = False):
+        if fresh:
+            self.entries = {}
+        else:
+            self.load()
+        d = os.path.dirname(self.path)
+        if d and not os.path.isdir(d):
+            os.makedirs(d)
+        self.f = open(self.path,"w" if fresh else "a")
+        if not fresh and self.f.tell():
+            # Make sure a torn line doesn't swallow our first entry
+            with open(self.path,"rb") as f:
+                f.seek(-1,os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self.f.write("\n")
+        return self
+
+    def append(self, entry):
+        self.entries[entry["key"]] = entry
+        self.f.write(json.dumps(entry,sort_keys=True)+"\n")
+        self.pending += 1
+        if self.pending >= self.batch_size or time.time()-self.synced >= self.interval:
+            self.sync()
+
+    def sync(self):
+        if not self.f or not self.pending:
+            return
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.pending = 0
+        self.synced = time.time()
+
+    def close(self):
+        if not self.f:
+            return
+        self.sync()
+        self.f.close()
+        self.f = None
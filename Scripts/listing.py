@@ -0,0 +1,469 @@
+import sys, os, re, bisect, binascii, mmap, multiprocessing
+sys.path.append(os.path.abspath(os.path.dirname(os.path.realpath(__file__))))
+import irq
+
+# The only lines the index pass needs to look at
+_tokens = re.compile(b"Device \\(|IRQNoFlags")
+
+class Listing:
+
+    def __init__(self, data = None, path = None, processes = None):
+        # data is the raw listing - bytes, or an mmap of the .dsl.  Indexes
+        # handed out (hpet_crs, IRQ.index, run starts/ends) are the byte
+        # offsets of the lines they refer to.  Passing the path of a mapped
+        # listing lets big ones be indexed across processes.
+        self.data = b""
+        self.parallel_size = 33554432 # 32MiB
+        self._reset_runs()
+        # Raw offset -> end of the region to search, used when built from AML
+        self.raw_spans = {}
+        # Walker indexes only - returns iasl's listing of the same table for
+        # anything the raw offsets can't place
+        self.fallback = None
+        self.fallback_index = None
+        self.hpet_crs = -1
+        self.devices = {}
+        self.has_lpcb = False
+        self.has_lpc = False
+        if data != None:
+            self.index(data, path, processes)
+
+    def _reset_runs(self):
+        # Hex runs are found as they're asked for, and kept as parallel,
+        # sorted lists of start/end line offsets, the AML offsets of their
+        # first byte and just past their last, and the hex length of their
+        # first line.  Streamed listings also note which run follows which.
+        self.run_starts = []
+        self.run_ends = []
+        self.run_offsets = []
+        self.run_lasts = []
+        self.run_firsts = []
+        self.run_hex = {}
+        self.run_next = {}
+
+    def is_hex(self, line):
+        return ":" in line.split("//")[0]
+
+    def is_filler(self, line):
+        # Only brackets, parens and whitespace (or a comment)
+        return not len(line.replace("{","").replace("}","").replace("(","").replace(")","").replace(" ","").split("//")[0])
+
+    def get_hex(self, line):
+        # strip the header and commented end
+        return line.split(":")[1].split("//")[0].replace(" ","")
+
+    def get_mask(self, text):
+        # Converts a "0,8,11" IRQ list into its 16-bit mask, skipping anything
+        # that isn't a valid IRQ number
+        mask = 0
+        for i in text.split(","):
+            try: i = int(i)
+            except: continue # Not an int (or the # null value)
+            if 0 <= i <= 15:
+                mask |= 1 << i
+        return mask
+
+    def get_line_offset(self, line):
+        # Returns the AML offset printed at the start of a hex line, or -1
+        try:
+            return int(line.split(":")[0].strip(),16)
+        except:
+            return -1
+
+    def get_line(self, pos):
+        # Decodes the line starting at pos - returns the text and the offset
+        # of the next line (-1 at the end of the listing)
+        end = self.data.find(b"\n", pos)
+        line = self.data[pos:len(self.data) if end == -1 else end]
+        if line.endswith(b"\r"):
+            line = line[:-1]
+        return (line.decode("utf-8","replace"), -1 if end == -1 else end+1)
+
+    def get_line_start(self, pos):
+        return self.data.rfind(b"\n", 0, pos)+1
+
+    def find_line(self, token, pos = 0, end = None):
+        # Returns the offset of the first non-hex line from pos containing token
+        end = len(self.data) if end == None else end
+        while True:
+            pos = self.data.find(token, pos, end)
+            if pos == -1:
+                return -1
+            start = self.get_line_start(pos)
+            line,pos = self.get_line(start)
+            if not self.is_hex(line):
+                return start
+            if pos == -1:
+                return -1
+
+    def find_next_line(self, pos, hex_line = False):
+        # Returns the offset of the next hex (or non-hex) line at or after pos
+        while pos != -1 and pos < len(self.data):
+            line,next_pos = self.get_line(pos)
+            if self.is_hex(line) == hex_line:
+                return pos
+            pos = next_pos
+        return -1
+
+    def index(self, data, path = None, processes = None):
+        # Scans the listing for the few tokens we care about - the HPET _CRS,
+        # every IRQNoFlags descriptor and the LPC scope - only decoding the
+        # lines around each match
+        self.data = data
+        self._reset_runs()
+        self.has_lpcb = data.find(b"PCI0.LPCB") != -1
+        self.has_lpc = self.has_lpcb or data.find(b"PCI0.LPC") != -1
+        self.hpet_crs = -1
+        hpet = self.find_line(b"Device (HPET)")
+        if hpet != -1:
+            crs = self.find_line(b"Method (_CRS", self.get_line(hpet)[1])
+            if crs != -1:
+                # The next hex run holds it
+                self.hpet_crs = self.get_next_run(self.get_line(crs)[1])
+        self.devices = {} # device -> [irq.IRQ, ...]
+        chunks = self.get_chunks(processes) if path else []
+        if len(chunks) > 1:
+            self.index_parallel(path, chunks, processes)
+        else:
+            self.index_devices(0, len(data))
+        return self
+
+    def get_chunks(self, processes = None):
+        # Splits the listing into (start, end) ranges that each begin on a
+        # Device line - those reset the IRQ state, so every range can be
+        # indexed on its own.  Returns a single range if the listing is too
+        # small to be worth it, or we're already in a pool worker.
+        size = len(self.data)
+        processes = processes or multiprocessing.cpu_count() or 1
+        if size < self.parallel_size or processes < 2 or multiprocessing.current_process().daemon:
+            return [(0,size)]
+        count = processes*2
+        starts = [0]
+        for i in range(1,count):
+            pos = self.find_line(b"Device (", max(starts[-1]+1, size*i//count))
+            if pos == -1:
+                break
+            if pos > starts[-1]:
+                starts.append(pos)
+        return list(zip(starts,starts[1:]+[size]))
+
+    def index_parallel(self, path, chunks, processes = None):
+        # Indexes each range in a pool worker - they map the file themselves,
+        # so only the ranges and their findings cross over.  Merged in order,
+        # the result matches the serial pass.
+        pool = multiprocessing.Pool(min(len(chunks),processes or multiprocessing.cpu_count() or 1))
+        try:
+            for devices,runs in pool.imap(_index_chunk, [(path,start,end) for start,end in chunks]):
+                for run in runs:
+                    self._insert_run(*run)
+                for dev,irqs in devices:
+                    self.devices.setdefault(dev,[]).extend([irq.IRQ().from_list(x) for x in irqs])
+        finally:
+            pool.close()
+            pool.join()
+
+    def index_devices(self, pos, end):
+        # Collects the IRQNoFlags descriptors of every device in the range
+        current_device = None
+        last_irq = -1 # Offset just past the last IRQ list in a row, or -1
+        skip = -1 # Lines before this were already handled
+        for m in _tokens.finditer(self.data, pos, end):
+            if m.start() < skip:
+                continue
+            start = self.get_line_start(m.start())
+            line,skip = self.get_line(start)
+            if skip == -1:
+                skip = len(self.data)
+            if self.is_hex(line):
+                continue
+            if "Device (" in line:
+                current_device = line.split("(")[1].split(")")[0]
+                last_irq = -1
+                continue
+            if not current_device:
+                # Not filler - breaks any run of IRQs
+                last_irq = -1
+                continue
+            # Next non-hex line has our interrupts
+            values = self.find_next_line(skip)
+            if values == -1:
+                break
+            text,skip = self.get_line(values)
+            if skip == -1:
+                skip = len(self.data)
+            # Chained if in a row - only hex and filler lines between this and
+            # the last one - otherwise it's a new run or a new device
+            chained = current_device in self.devices and last_irq != -1 and self.is_run_of_filler(last_irq, start)
+            r = irq.IRQ(mask=self.get_mask(text.split("{")[1].split("}")[0]), chained=chained)
+            r.index = self.get_next_run(skip)
+            self.devices.setdefault(current_device,[]).append(r)
+            last_irq = skip
+
+    def is_run_of_filler(self, pos, end):
+        # True if every non-hex line from pos up to end is filler
+        while pos != -1 and pos < end:
+            line,pos = self.get_line(pos)
+            if not self.is_hex(line) and not self.is_filler(line):
+                return False
+        return True
+
+    def get_next_run(self, pos):
+        # Returns the start of the first hex run at or after the line at pos,
+        # recording its bounds - or -1 if there isn't one
+        start = self.find_next_line(pos, hex_line=True)
+        if start == -1:
+            return -1
+        if start in self.run_hex:
+            return start
+        lines = []
+        pos = start
+        while pos != -1 and pos < len(self.data):
+            line,next_pos = self.get_line(pos)
+            if not self.is_hex(line):
+                break
+            lines.append((pos,line))
+            pos = next_pos
+        self.add_run(lines)
+        return start
+
+    def add_run(self, lines):
+        # Records a hex run from its list of (offset, line) pairs
+        start = lines[0][0]
+        if start in self.run_hex:
+            return
+        hex_lines = [self.get_hex(x[1]) for x in lines]
+        last = self.get_line_offset(lines[-1][1])
+        try:
+            last += len(binascii.unhexlify(hex_lines[-1]))
+        except:
+            last = -1
+        self._insert_run(start, lines[-1][0], self.get_line_offset(lines[0][1]), last, len(hex_lines[0]), "".join(hex_lines))
+
+    def _insert_run(self, start, end, offset, last, first, hex_text):
+        if start in self.run_hex:
+            return
+        r = bisect.bisect_left(self.run_starts, start)
+        self.run_starts.insert(r, start)
+        self.run_ends.insert(r, end)
+        self.run_offsets.insert(r, offset)
+        self.run_lasts.insert(r, last)
+        self.run_firsts.insert(r, first)
+        self.run_hex[start] = hex_text
+
+    def detach(self, lookahead = 8):
+        # Records the lookahead runs after each one recorded so far and lets
+        # go of the listing - from then on the index only follows held runs
+        # like a streamed one does, so a mapped listing can be closed
+        for start in list(self.run_starts):
+            for _ in range(lookahead):
+                next_start = self.run_next.get(start)
+                if next_start == None:
+                    end = self.run_ends[self._run_for(start)]
+                    next_start = self.get_next_run(self.get_line(end)[1])
+                    if next_start == -1:
+                        break
+                    self.run_next[start] = next_start
+                start = next_start
+        self.data = b""
+        return self
+
+    def get_runs_recorded(self):
+        # Every recorded run as the arguments _insert_run takes
+        return [(x,self.run_ends[i],self.run_offsets[i],self.run_lasts[i],self.run_firsts[i],self.run_hex[x]) for i,x in enumerate(self.run_starts)]
+
+    def read_lines(self, stream):
+        # Tokenizer stage - yields (offset, line, is hex) for every line read
+        # from a binary file, pipe, or any other iterable of byte lines
+        pos = 0
+        for line in stream:
+            size = len(line)
+            line = line.rstrip(b"\r\n").decode("utf-8","replace")
+            yield (pos, line, self.is_hex(line))
+            pos += size
+
+    def get_runs(self, lines):
+        # Groups consecutive hex lines - yields ("run", [(offset, line), ...])
+        # once each run ends, and ("line", offset, line) for everything else.
+        # Only the run in progress is ever held.
+        run = []
+        for pos,line,is_hex in lines:
+            if is_hex:
+                run.append((pos,line))
+                continue
+            if run:
+                yield ("run",run)
+                run = []
+            yield ("line",pos,line)
+        if run:
+            yield ("run",run)
+
+    def index_stream(self, stream, lookahead = 4):
+        # Builds the index in one pass over a stream without holding onto it -
+        # the same state machine as walking the lines in order.  Only the hex
+        # runs our findings resolve to are kept, along with the lookahead runs
+        # after each that padding a patch might need.
+        self.data = b""
+        self._reset_runs()
+        self.has_lpcb = self.has_lpc = False
+        self.hpet_crs = -1
+        self.devices = {} # device -> [irq.IRQ, ...]
+        pending = [] # IRQs waiting on the next hex run
+        found_hpet = False
+        crs_pending = False
+        current_device = None
+        irq_next = False
+        last_irq = False
+        keep = 0 # Runs left to hold after the last one we needed
+        prev = None # Start of the last run held, if it was the one just seen
+        for item in self.get_runs(self.read_lines(stream)):
+            if item[0] == "run":
+                run = item[1]
+                if not self.has_lpcb:
+                    self.check_scope([x[1] for x in run])
+                start = run[0][0]
+                if pending or crs_pending:
+                    # Start of the hex run our findings were waiting on
+                    for r in pending:
+                        r.index = start
+                    pending = []
+                    if crs_pending:
+                        self.hpet_crs = start
+                        crs_pending = False
+                    keep = lookahead+1
+                if not keep:
+                    prev = None
+                    continue
+                self.add_run(run)
+                if prev != None:
+                    self.run_next[prev] = start
+                prev = start
+                keep -= 1
+                continue
+            pos,line = item[1],item[2]
+            if not self.has_lpcb:
+                self.check_scope([line])
+            # Check for the HPET _CRS
+            if self.hpet_crs == -1 and not crs_pending:
+                if "Device (HPET)" in line:
+                    found_hpet = True
+                elif found_hpet and "Method (_CRS" in line:
+                    # Found the _CRS - the next hex run holds it
+                    crs_pending = True
+            # Keep track of the current device and save the IRQNoFlags if found
+            if irq_next:
+                # Chained if in a row, otherwise we skipped at least one line
+                # or it's a new device
+                r = irq.IRQ(mask=self.get_mask(line.split("{")[1].split("}")[0]), chained=current_device in self.devices and last_irq)
+                self.devices.setdefault(current_device,[]).append(r)
+                pending.append(r)
+                irq_next = False
+                last_irq = True
+            elif "Device (" in line:
+                current_device = line.split("(")[1].split(")")[0]
+                last_irq = False
+            elif "IRQNoFlags" in line and current_device:
+                # Next line has our interrupts
+                irq_next = True
+            elif not self.is_filler(line):
+                # Reset last IRQ as it's not in a row
+                last_irq = False
+        return self
+
+    def check_scope(self, lines):
+        for line in lines:
+            if "PCI0.LPC" in line:
+                self.has_lpc = True
+                if "PCI0.LPCB" in line:
+                    self.has_lpcb = True
+                    return
+
+    def get_scope(self):
+        if self.has_lpcb:
+            return "LPCB"
+        elif self.has_lpc:
+            return "LPC"
+        return ""
+
+    def _run_for(self, index):
+        # Returns the position of the hex run containing index, or -1
+        r = bisect.bisect_right(self.run_starts, index)-1
+        if r >= 0 and self.run_ends[r] >= index:
+            return r
+        return -1
+
+    def get_hex_starting_at(self, start_index):
+        # Returns a tuple of the hex, and the ending index
+        r = self._run_for(start_index)
+        if r == -1:
+            return ("", -1)
+        end = self.run_ends[r]
+        if start_index != self.run_starts[r]:
+            # Partial run - build it without caching
+            hex_text = []
+            pos = start_index
+            while pos != -1 and pos <= end:
+                line,pos = self.get_line(pos)
+                hex_text.append(self.get_hex(line))
+            return ("".join(hex_text), end)
+        return (self.run_hex[start_index], end)
+
+    def find_next_hex(self, index=0):
+        # Returns the hex, start and end index of the next hex run after the run
+        # (or line) at the passed index
+        r = self._run_for(index)
+        after = self.run_ends[r] if r != -1 else index
+        if not self.data:
+            # Streamed - we can only follow runs that were held
+            start_index = self.run_next.get(self.run_starts[r],-1) if r != -1 else -1
+        elif after < 0 or after >= len(self.data):
+            return ("",-1,-1)
+        else:
+            start_index = self.get_next_run(self.get_line(after)[1])
+        if start_index == -1:
+            return ("",-1,-1)
+        hex_text,end_index = self.get_hex_starting_at(start_index)
+        return (hex_text, start_index, end_index)
+
+    def get_offset(self, index, raw):
+        # Maps the hex run at index to a (start, end) byte range in the raw
+        # table - returns (-1,-1) if the listing offsets don't line up
+        if index in self.raw_spans:
+            # Already a raw offset
+            return (index,self.raw_spans[index])
+        r = self._run_for(index)
+        if r == -1:
+            return (-1,-1)
+        if index == self.run_starts[r]:
+            start = self.run_offsets[r]
+            first = self.run_hex[index][:self.run_firsts[r]]
+        else:
+            line = self.get_line(index)[0]
+            start = self.get_line_offset(line)
+            first = self.get_hex(line)
+        end = self.run_lasts[r]
+        if start == -1 or end == -1:
+            return (-1,-1)
+        try:
+            first = binascii.unhexlify(first)
+        except:
+            return (-1,-1)
+        # Offsets are either from the start of the table, or from the start
+        # of the AML just past the 36 byte header - verify against the bytes
+        for base in (0,36):
+            if raw[start+base:start+base+len(first)] == first:
+                return (start+base,end+base)
+        return (-1,-1)
+
+def _index_chunk(args):
+    # Pool worker for Listing.index_parallel - returns the devices found in
+    # the range as (name, [IRQ lists]) pairs, and the hex runs they resolve to
+    path,start,end = args
+    with open(path,"rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        l = Listing()
+        l.data = data
+        l.index_devices(start, end)
+        return ([(x,[r.to_list() for r in l.devices[x]]) for x in l.devices], l.get_runs_recorded())
+    finally:
+        data.close()
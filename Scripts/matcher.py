@@ -0,0 +1,81 @@
+import re
+
+class Matcher:
+
+    def __init__(self, patterns = None):
+        self.patterns = []
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        self.starts = None
+        for p in patterns or []:
+            self.add(p)
+        if patterns:
+            self.build()
+
+    def add(self, pattern):
+        # Adds a bytes pattern to the trie - call build() once all are added
+        if not len(pattern) or pattern in self.patterns:
+            return
+        self.patterns.append(pattern)
+        node = 0
+        for c in bytearray(pattern):
+            if not c in self.goto[node]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+                self.goto[node][c] = len(self.goto)-1
+            node = self.goto[node][c]
+        self.out[node].append(pattern)
+
+    def build(self):
+        # Breadth first walk to set the failure links, merging the outputs of
+        # each node's failure target so a single pass reports every match
+        queue = list(self.goto[0].values())
+        for node in queue:
+            self.fail[node] = 0
+        i = 0
+        while i < len(queue):
+            node = queue[i]
+            i += 1
+            for c,child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and not c in self.goto[f]:
+                    f = self.fail[f]
+                f = self.goto[f].get(c,0)
+                self.fail[child] = f if f != child else 0
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+        # Every byte a pattern can start with - lets scan() skip to the next
+        # candidate at C speed rather than stepping through each byte
+        if self.goto[0]:
+            self.starts = re.compile(b"["+b"".join(re.escape(bytes(bytearray([c]))) for c in sorted(self.goto[0]))+b"]")
+        return self
+
+    def scan(self, data):
+        # Returns a dict of pattern -> list of (possibly overlapping) offsets
+        found = dict([(p,[]) for p in self.patterns])
+        goto,fail,out = self.goto,self.fail,self.out
+        root = goto[0]
+        if not self.starts:
+            return found
+        data = bytearray(data)
+        node = 0
+        i = 0
+        while i < len(data):
+            if not node:
+                # Fast path - jump straight to the next byte that starts a pattern
+                m = self.starts.search(data, i)
+                if not m:
+                    break
+                i = m.start()
+                node = root[data[i]]
+            else:
+                c = data[i]
+                while node and not c in goto[node]:
+                    node = fail[node]
+                node = goto[node].get(c,0)
+            for p in out[node]:
+                found[p].append(i-len(p)+1)
+            i += 1
+        return found
@@ -0,0 +1,236 @@
+import os, json, threading, multiprocessing, base64, signal
+try:
+    from Queue import Queue
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except:
+    from queue import Queue
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class _Worker:
+    # One worker process fed jobs over a pipe - a job that runs past the
+    # timeout takes the whole process (and anything it spawned, like iasl)
+    # down with it, and a fresh one takes its place
+
+    def __init__(self, worker, initializer = None, initargs = ()):
+        self.worker = worker
+        self.initializer = initializer
+        self.initargs = initargs
+        self.process = None
+        self.conn = None
+        self.start()
+
+    def start(self):
+        self.conn,child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve, args=(child,self.worker,self.initializer,self.initargs))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        if not self.process:
+            return
+        try:
+            # The worker leads its own process group - take all of it
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (AttributeError, OSError):
+            self.process.terminate()
+        self.process.join()
+        self.conn.close()
+        self.process = None
+
+    def run(self, args, timeout):
+        # Returns the worker's result, only once the process is free again
+        try:
+            self.conn.send(args)
+            if self.conn.poll(timeout):
+                return self.conn.recv()
+            result = {"error":"Timed out after {:,} seconds".format(timeout),"status":504}
+        except (EOFError, IOError, OSError) as e:
+            result = {"error":"Worker died: {}".format(e),"status":500}
+        self.stop()
+        self.start()
+        return result
+
+def _serve(conn, worker, initializer, initargs):
+    # Worker process loop - one job in, one result out
+    if hasattr(os,"setsid"):
+        os.setsid()
+    if initializer:
+        initializer(*initargs)
+    while True:
+        try:
+            args = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = worker(*args)
+        except Exception as e:
+            result = {"error":str(e),"status":500}
+        conn.send(result)
+
+class _Job:
+    def __init__(self, args):
+        self.args = args
+        self.result = None
+        self.done = threading.Event()
+
+class Service:
+
+    def __init__(self, worker, initializer = None, initargs = (), **kwargs):
+        # worker(dsdt, ssdts, policy, scope) runs in a pool of worker processes
+        # and returns a JSON-friendly dict - with an "error" key on failure.
+        # validate(policy, scope) can raise to answer 400 before queuing.
+        self.worker = worker
+        self.validate = kwargs.get("validate")
+        self.initializer = initializer
+        self.initargs = initargs
+        self.host = kwargs.get("host","127.0.0.1")
+        self.port = kwargs.get("port",8080)
+        self.processes = kwargs.get("processes") or multiprocessing.cpu_count() or 1
+        self.queue_size = kwargs.get("queue_size",self.processes*4)
+        self.timeout = kwargs.get("timeout",120)
+        self.max_body = kwargs.get("max_body",67108864) # 64MiB
+        self.queue = Queue()
+        # Every job holds a slot from submit until its worker is free again,
+        # so at most processes are running with queue_size more waiting
+        self.slots = threading.Semaphore(self.processes+self.queue_size)
+        self.workers = []
+        self.server = None
+        self.threads = []
+
+    def start(self):
+        # Binds the server and spins up the workers - returns the bound (host, port)
+        for x in range(self.processes):
+            w = _Worker(self.worker, self.initializer, self.initargs)
+            self.workers.append(w)
+            t = threading.Thread(target=self._run_jobs, args=(w,))
+            t.daemon = True
+            t.start()
+            self.threads.append(t)
+        # Give the handlers a reference back to us
+        handler = type("Handler",(_Handler,),{"service":self})
+        self.server = _Server((self.host, self.port), handler)
+        self.host,self.port = self.server.server_address[:2]
+        return (self.host, self.port)
+
+    def serve_forever(self):
+        try:
+            self.server.serve_forever()
+        finally:
+            self.close()
+
+    def stop(self):
+        # Stops serve_forever() - must be called from another thread
+        if self.server:
+            self.server.shutdown()
+
+    def close(self):
+        if self.server:
+            self.server.server_close()
+            self.server = None
+        for t in self.threads:
+            self.queue.put(None)
+        self.threads = []
+        for w in self.workers:
+            w.stop()
+        self.workers = []
+
+    def _run_jobs(self, w):
+        # Each thread feeds one job at a time to its own worker
+        while True:
+            job = self.queue.get()
+            if job == None:
+                return
+            try:
+                job.result = w.run(job.args, self.timeout)
+            except Exception as e:
+                job.result = {"error":str(e),"status":500}
+            self.slots.release()
+            job.done.set()
+
+    def submit(self, args):
+        # Queues a job and waits for it - returns None if the queue is full
+        if not self.slots.acquire(False):
+            return None
+        job = _Job(args)
+        self.queue.put(job)
+        # Every job ahead of us is cut off at the timeout, so this finishes
+        job.done.wait()
+        return job.result
+
+    def get_status(self):
+        return {"status":"ok","processes":self.processes,"queued":self.queue.qsize(),"queue_size":self.queue_size}
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def log_message(self, format, *args):
+        # Keep the console quiet - errors still come back in the responses
+        return
+
+    def _send(self, status, body):
+        data = json.dumps(body,sort_keys=True).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type","application/json")
+        self.send_header("Content-Length",str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After","1")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urlparse(self.path).path.rstrip("/") in ("","/health"):
+            return self._send(200, self.service.get_status())
+        self._send(404, {"error":"Not found"})
+
+    def do_POST(self):
+        # Accepts either a JSON body of {"dsdt":base64, "ssdts":{name:base64},
+        # "policy":..., "scope":...}, or the raw DSDT.aml with policy/scope in
+        # the query string
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != "/analyze":
+            return self._send(404, {"error":"Not found"})
+        try:
+            length = int(self.headers.get("Content-Length",0))
+        except:
+            length = -1
+        if length <= 0:
+            return self._send(411, {"error":"A Content-Length is required"})
+        if length > self.service.max_body:
+            return self._send(413, {"error":"Request body exceeds {:,} bytes".format(self.service.max_body)})
+        body = self.rfile.read(length)
+        try:
+            if self.headers.get("Content-Type","").split(";")[0].strip() == "application/json":
+                req = json.loads(body.decode("utf-8"))
+                dsdt = base64.b64decode(req["dsdt"])
+                ssdts = dict([(x,base64.b64decode(y)) for x,y in req.get("ssdts",{}).items()])
+                # The names end up as file names in the workspace - keep them tame
+                for x in ssdts:
+                    if x != os.path.basename(x) or x.startswith(".") or not x.lower().endswith(".aml"):
+                        raise Exception("Invalid SSDT name: {}".format(x))
+                policy,scope = req.get("policy","c"),req.get("scope")
+            else:
+                query = parse_qs(url.query)
+                dsdt,ssdts = body,{}
+                policy,scope = query.get("policy",["c"])[0],query.get("scope",[None])[0]
+        except Exception as e:
+            return self._send(400, {"error":"Malformed request: {}".format(e)})
+        if self.service.validate:
+            try:
+                self.service.validate(policy, scope)
+            except Exception as e:
+                return self._send(400, {"error":"Invalid request: {}".format(e)})
+        result = self.service.submit((dsdt,ssdts,policy,scope))
+        if result == None:
+            return self._send(429, {"error":"Too many requests queued - try again later"})
+        if "error" in result:
+            return self._send(result.pop("status",422), result)
+        self._send(200, result)
@@ -0,0 +1,74 @@
+import os
+
+class SuffixArray:
+
+    def __init__(self, data = b""):
+        self.data = b""
+        self.sa = []
+        self.rank = []
+        self.lcp = {} # rank -> lcp with the suffix ranked just before it
+        self.build(data)
+
+    def build(self, data):
+        # Prefix doubling - each pass sorts the suffixes on the rank pair of
+        # (first k bytes, next k bytes) until every rank is distinct
+        self.data = data
+        self.lcp = {}
+        n = len(data)
+        # Seed the ranks by sorting on the first 16 bytes directly, which
+        # saves the first four doubling passes
+        k = 16
+        keys = [data[i:i+k] for i in range(n)]
+        sa = list(range(n))
+        sa.sort(key=keys.__getitem__)
+        rank = [0]*n
+        r = 0
+        for i in range(1,n):
+            if keys[sa[i]] != keys[sa[i-1]]:
+                r += 1
+            rank[sa[i]] = r
+        while n and r != n-1:
+            # Shift the second half up by one so the "past the end" suffixes sort first
+            width = n+1
+            keys = [a*width+b+1 for a,b in zip(rank, rank[k:])] + [a*width for a in rank[n-k:]] if k < n else [a*width for a in rank]
+            sa.sort(key=keys.__getitem__)
+            new_rank = [0]*n
+            r = 0
+            for i in range(1,n):
+                if keys[sa[i]] != keys[sa[i-1]]:
+                    r += 1
+                new_rank[sa[i]] = r
+            rank = new_rank
+            k *= 2
+        self.sa = sa
+        self.rank = rank
+        return self
+
+    def _get_lcp(self, r):
+        # Returns the common prefix length of the suffixes at ranks r-1 and r
+        if r <= 0 or r >= len(self.sa):
+            return 0
+        if not r in self.lcp:
+            a,b = self.sa[r-1],self.sa[r]
+            l,step = 0,16
+            while True:
+                x,y = self.data[a+l:a+l+step],self.data[b+l:b+l+step]
+                if x == y and len(x) == step:
+                    l += step
+                    step = min(step*2,4096)
+                    continue
+                l += len(os.path.commonprefix([x,y]))
+                break
+            self.lcp[r] = l
+        return self.lcp[r]
+
+    def unique_length(self, offset, min_length = 1):
+        # Returns the shortest length >= min_length for which the bytes at
+        # offset occur exactly once in the data, or -1 if we hit the end first
+        if offset < 0 or offset >= len(self.data):
+            return -1
+        r = self.rank[offset]
+        length = max(min_length, self._get_lcp(r)+1, self._get_lcp(r+1)+1)
+        if offset+length > len(self.data):
+            return -1
+        return length
@@ -0,0 +1,49 @@
+import os, hashlib
+
+class Watch:
+
+    def __init__(self):
+        self.stats = {} # path -> (mtime, size, inode)
+        self.hashes = {} # path -> sha256 of the contents
+
+    def _get_stat(self, path):
+        try:
+            st = os.stat(path)
+        except:
+            return None
+        return (st.st_mtime, st.st_size, st.st_ino)
+
+    def _get_hash(self, path):
+        h = hashlib.sha256()
+        try:
+            with open(path,"rb") as f:
+                for chunk in iter(lambda: f.read(1048576), b""):
+                    h.update(chunk)
+        except:
+            return None
+        return h.hexdigest()
+
+    def poll(self, paths):
+        # Returns the list of paths whose contents changed (or appeared or went
+        # away) since the last poll - files are only hashed when their stat
+        # info moved, so an idle poll is just a stat per file
+        changed = []
+        paths = set(paths)
+        for path in paths | set(self.stats):
+            st = self._get_stat(path) if path in paths else None
+            if st == self.stats.get(path):
+                continue
+            if st == None:
+                # Removed
+                self.stats.pop(path,None)
+                if self.hashes.pop(path,None) != None:
+                    changed.append(path)
+                continue
+            self.stats[path] = st
+            h = self._get_hash(path)
+            if h != self.hashes.get(path):
+                # Only count it if the bytes really differ - a touch or copy
+                # of identical contents doesn't matter to us
+                self.hashes[path] = h
+                changed.append(path)
+        return sorted(changed)
@@ -0,0 +1,61 @@
+import os, sys, unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import FixHPET
+from Scripts import aml
+
+class IRQEndingTests(unittest.TestCase):
+    # A DSDT whose IRQNoFlags descriptors end differently - RTC's IRQ 8 is
+    # followed by IO (4701) while IRQ 8 followed by an end tag (7900) shows
+    # up twice elsewhere, so guessing the ending from the whole table would
+    # pick the wrong one
+
+    def setUp(self):
+        self.a = aml.AML()
+        self.f = FixHPET.FixHPET()
+
+    def pkg(self, op, body):
+        return bytearray(op)+self.a.encode_pkg_length(len(body))+body
+
+    def buf(self, data):
+        return self.pkg(b"\x11", bytearray([0x0A,len(data)])+bytearray(data))
+
+    def device(self, name, body):
+        return self.pkg(b"\x5B\x82", bytearray(name.ljust(4,"_").encode("ascii"))+body)
+
+    def name_crs(self, hex_text):
+        return bytearray(b"\x08_CRS")+self.buf(bytearray.fromhex(hex_text))
+
+    def get_dsdt(self):
+        hpet = self.device("HPET", self.pkg(b"\x14", bytearray(b"_CRS\x00\xA4")+self.buf(bytearray.fromhex("860900010000D0FE000400007900"))))
+        rtc = self.device("RTC", self.name_crs("220001"+"4701700070000108"+"7900"))
+        xxa = self.device("XXA", self.name_crs("4701800080000101"+"220001"+"7900"))
+        xxb = self.device("XXB", self.name_crs("4701900090000101"+"220001"+"7900"))
+        tmr = self.device("TMR", self.name_crs("4701400040000104"+"220100"+"7900"))
+        lpcb = self.device("LPCB", hpet+rtc+xxa+xxb+tmr)
+        body = self.pkg(b"\x10", bytearray(b"\\_SB_")+self.device("PCI0", lpcb))
+        return self.a.build_table("DSDT", body, "OEMID ", "TABLEID ")
+
+    def get_patches(self, policy):
+        dsdt = self.get_dsdt()
+        result = self.f.analyze(dsdt, policy=policy, scope="LPCB")
+        patches = dict([(x["Comment"],x) for x in result["patches"]])
+        # Every Find has to land exactly once in the table
+        for p in result["patches"]:
+            self.assertEqual(dsdt.count(bytes(bytearray.fromhex(p["Find"]))), 1, p["Comment"])
+        return patches
+
+    def test_optional_policy(self):
+        patches = self.get_patches("o")
+        self.assertEqual(patches["RTC IRQ 8 Patch"]["Find"], "2200014701")
+        self.assertEqual(patches["RTC IRQ 8 Patch"]["Replace"], "2200004701")
+        self.assertTrue(patches["XXA IRQ 8 Patch"]["Find"].startswith("2200017900"))
+        self.assertEqual(patches["TMR IRQ 0 Patch"]["Find"], "2201007900")
+
+    def test_custom_policy(self):
+        patches = self.get_patches("RTC:8 XXB:")
+        self.assertEqual(patches["RTC IRQ 8 Patch"]["Find"], "2200014701")
+        self.assertTrue(patches["XXB IRQ 8 Patch"]["Find"].startswith("2200017900"))
+        self.assertFalse("XXA IRQ 8 Patch" in patches)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os, sys, mmap, shutil, tempfile, unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Scripts import listing
+
+class ParallelIndexTests(unittest.TestCase):
+    # Indexing a listing across a pool has to give exactly what the serial
+    # pass does - the same devices are spread over every chunk, so merging
+    # them out of order (or losing chained IRQs at a boundary) would show
+
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp, "DSDT.dsl")
+        with open(self.path,"wb") as f:
+            f.write(self.get_listing(600).encode("utf-8"))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp, ignore_errors=True)
+
+    def hex_line(self, offset, data):
+        return "    {:08X}: {}  // ....".format(offset, " ".join("{:02X}".format(x) for x in data))
+
+    def get_listing(self, count):
+        lines = ["    Scope (\\_SB.PCI0.LPCB)", self.hex_line(0x24, [0x10,0x40])]
+        lines += ["                Device (HPET)", self.hex_line(0x3C, [0x5B,0x82,0x29,0x48,0x50,0x45,0x54]), "                {"]
+        lines += ["                    Method (_CRS, 0, Serialized)", self.hex_line(0x4D, [0x14,0x19,0x5F,0x43,0x52,0x53,0x08]), "                }"]
+        offset = 0x100
+        for i in range(count):
+            name = ("RTC","TMR","IPIC","F{:03X}".format(i%7))[i%4]
+            irqs = [[8],[0,2],[2],[0,8,11]][i%4]
+            lines += ["", "                Device ({})".format(name), self.hex_line(offset, [0x5B,0x82,0x3E]+[0x41]*4)]
+            lines += ["                    Name (_CRS, ResourceTemplate ()", "                    {"]
+            data = []
+            for a,x in enumerate(irqs if i%3 else irqs[:1]):
+                lines += ["                        IRQNoFlags ()", "                            {{{}}}".format(x)]
+                data += [0x22,1 << x & 0xFF,1 << x >> 8]
+                if i%5 == 0 and a == 0:
+                    # Not filler - breaks the chain
+                    lines += ["                        IO (Decode16,", "                            )"]
+                    data += [0x47,0x01,0x70,0x00,0x70,0x00,0x01,0x02]
+            lines += ["                    })", self.hex_line(offset+7, data+[0x79,0x00]), "                }"]
+            offset += 0x40
+        return "\n".join(lines)+"\n"
+
+    def get_index(self, parallel):
+        with open(self.path,"rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            l = listing.Listing()
+            if parallel:
+                l.parallel_size = 4096
+                l.index(data, self.path, 4)
+                # Make sure it really was split up
+                self.assertTrue(len(l.get_chunks(4)) > 4)
+            else:
+                l.index(data)
+            return {
+                "hpet_crs":l.hpet_crs,
+                "scope":l.get_scope(),
+                "devices":dict([(x,[r.to_list() for r in l.devices[x]]) for x in l.devices]),
+                "runs":l.get_runs_recorded()
+            }
+        finally:
+            data.close()
+
+    def test_parallel_matches_serial(self):
+        serial = self.get_index(False)
+        parallel = self.get_index(True)
+        self.assertEqual(serial["hpet_crs"], parallel["hpet_crs"])
+        self.assertEqual(serial["scope"], "LPCB")
+        self.assertEqual(serial["scope"], parallel["scope"])
+        self.assertEqual(sorted(serial["devices"]), sorted(parallel["devices"]))
+        for x in serial["devices"]:
+            self.assertEqual(serial["devices"][x], parallel["devices"][x], x)
+        self.assertEqual(serial["runs"], parallel["runs"])
+        # Same named devices turn up in every chunk
+        self.assertEqual(len(serial["devices"]["RTC"]), 150)
+
+if __name__ == "__main__":
+    unittest.main()
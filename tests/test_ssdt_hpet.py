@@ -0,0 +1,42 @@
+import os, sys, binascii, unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Scripts import aml
+
+class SSDTHPETTests(unittest.TestCase):
+    # The SSDT-HPET.aml we emit in place of iasl's, byte for byte - only the
+    # checksum and creator revision are left out of the comparison
+
+    def get_body(self, seg):
+        return (
+            # External (_SB_.PCI0.<seg>, DeviceObj)
+            "15"+"2F03"+"5F53425F"+"50434930"+seg+"0600"
+            # Name (\_SB.PCI0.<seg>.HPET._CRS, ResourceTemplate () {...})
+            "08"+"5C2F05"+"5F53425F"+"50434930"+seg+"48504554"+"5F435253"
+            "11140A11"
+            # IRQNoFlags () {0,8,11}
+            "220109"
+            # Memory32Fixed (ReadWrite, 0xFED00000, 0x00000400)
+            "860900010000D0FE00040000"
+            # End tag
+            "7900"
+        )
+
+    def check(self, scope, seg):
+        table = bytearray(aml.AML().build_ssdt_hpet(scope, [0,8,11]))
+        body = self.get_body(seg)
+        self.assertEqual(binascii.hexlify(table[:4]), b"53534454") # SSDT
+        self.assertEqual(binascii.hexlify(table[4:9]), b"6200000002") # Length, revision
+        self.assertEqual(binascii.hexlify(table[10:32]), b"6861636b0000"+b"4850455400000000"+b"00000000"+b"494e544c") # OEM ID, table ID, OEM revision, creator ID
+        self.assertEqual(binascii.hexlify(table[36:]).decode("utf-8").upper(), body)
+        self.assertEqual(len(table), 36+len(body)//2)
+        self.assertEqual(sum(table) % 0x100, 0)
+
+    def test_lpcb(self):
+        self.check("LPCB", "4C504342")
+
+    def test_lpc(self):
+        # Short names are padded with underscores
+        self.check("LPC", "4C50435F")
+
+if __name__ == "__main__":
+    unittest.main()
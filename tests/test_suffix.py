@@ -0,0 +1,48 @@
+import os, sys, random, unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Scripts import suffix
+
+class UniqueLengthTests(unittest.TestCase):
+    # unique_length has to agree with the obvious search - grow the run until
+    # it occurs once, counting overlapping occurrences
+
+    def occurrences(self, data, needle):
+        count = 0
+        pos = data.find(needle)
+        while pos != -1:
+            count += 1
+            pos = data.find(needle, pos+1)
+        return count
+
+    def brute_force(self, data, offset, min_length):
+        length = min_length
+        while offset+length <= len(data):
+            if self.occurrences(data, data[offset:offset+length]) == 1:
+                return length
+            length += 1
+        return -1
+
+    def check(self, data):
+        sa = suffix.SuffixArray(data)
+        for offset in range(len(data)):
+            for min_length in (1,2,5):
+                self.assertEqual(sa.unique_length(offset, min_length), self.brute_force(data, offset, min_length), (data, offset, min_length))
+
+    def test_random(self):
+        r = random.Random(0)
+        for size in (1,2,7,40,120):
+            for alphabet in (b"\x22\x01", b"\x22\x01\x79\x00"):
+                self.check(bytes(bytearray(r.choice(bytearray(alphabet)) for _ in range(size))))
+
+    def test_repetitive(self):
+        # Long repeats need more than the 16 byte seed sort to tell apart
+        self.check(b"\x22\x01\x00\x79"*20+b"\x86"+b"\x22\x01\x00\x79"*20)
+        self.check(b"\x00"*50)
+
+    def test_out_of_range(self):
+        sa = suffix.SuffixArray(b"abc")
+        self.assertEqual(sa.unique_length(-1), -1)
+        self.assertEqual(sa.unique_length(3), -1)
+
+if __name__ == "__main__":
+    unittest.main()